@@ -1,6 +1,13 @@
+from django.conf import settings
+from django.db import models
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, MealPlanEntry, Recipe, Tag
+from recipes.pantry import pantry_index
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Фильтр по списку чисел через запятую."""
 
 
 class IngredientFilter(filters.FilterSet):
@@ -13,6 +20,17 @@ class IngredientFilter(filters.FilterSet):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class MealPlanFilter(filters.FilterSet):
+    """Фильтр плана питания по датам включительно."""
+
+    start = filters.DateFilter(field_name='date', lookup_expr='gte')
+    end = filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ('start', 'end', 'recipe')
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
 
@@ -23,12 +41,38 @@ class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         queryset=Tag.objects.all(),
-        to_field_name='slug'
+        to_field_name='slug',
+        method='filter_tags'
     )
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_mode'
+    )
+    have = NumberInFilter(method='filter_have')
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'tags_mode', 'have')
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтр по тегам через EXISTS, без JOIN и DISTINCT."""
+        if not value:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=models.OuterRef('pk'))
+        tag_ids = [tag.id for tag in value]
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    models.Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        return queryset.filter(
+            models.Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+    def filter_tags_mode(self, queryset, name, value):
+        # Учитывается в filter_tags
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -40,3 +84,32 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(
                 shoppingcart_related__user=self.request.user)
         return queryset
+
+    def filter_have(self, queryset, name, value):
+        """Рецепты из имеющихся ингредиентов, лучшие совпадения первыми.
+
+        Фильтр объявлен последним, поэтому queryset уже отфильтрован по
+        автору, тегам и спискам. Ранжированные рецепты проверяются по нему
+        частями, пока не наберётся PANTRY_MAX_RESULTS подходящих.
+        """
+        if not value:
+            return queryset
+        limit = getattr(settings, 'PANTRY_MAX_RESULTS', 500)
+        ranked = [recipe_id for recipe_id, _, _ in pantry_index.rank(
+            [int(item) for item in value])]
+        recipe_ids = []
+        candidates = queryset.order_by().values_list('pk', flat=True)
+        for offset in range(0, len(ranked), limit):
+            chunk = ranked[offset:offset + limit]
+            allowed = set(candidates.filter(pk__in=chunk))
+            recipe_ids.extend(
+                recipe_id for recipe_id in chunk if recipe_id in allowed)
+            if len(recipe_ids) >= limit:
+                break
+        recipe_ids = recipe_ids[:limit]
+        if not recipe_ids:
+            return queryset.none()
+        return queryset.filter(pk__in=recipe_ids).order_by(models.Case(
+            *(models.When(pk=recipe_id, then=position)
+              for position, recipe_id in enumerate(recipe_ids)),
+            output_field=models.IntegerField()))
@@ -0,0 +1,156 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.metrics import cache_result
+from recipes import idempotency
+from recipes.models import IdempotencyKey
+from .serializers import parse_sparse_fields
+
+
+class ConditionalGetMixin:
+    """Слабые ETag и Last-Modified для list и retrieve.
+
+    Валидаторы считаются до сериализации: если клиент прислал совпадающие
+    If-None-Match/If-Modified-Since, сразу отвечаем 304. Пока view их
+    не задаёт, ответы отдаются без ETag.
+    """
+
+    def get_list_validators(self, queryset):
+        """(части ETag, дата изменения или None) для отфильтрованных."""
+        return None, None
+
+    def get_object_validators(self):
+        """(части ETag, дата изменения или None) для объекта."""
+        return None, None
+
+    def conditional_response(self, request, validators, handler,
+                             *args, **kwargs):
+        etag_parts, last_modified = validators
+        if etag_parts is None:
+            return handler(request, *args, **kwargs)
+
+        digest = hashlib.md5(
+            '|'.join(map(str, (request.get_full_path(), request.user.pk,
+                               *etag_parts)))
+            .encode('utf-8'))
+        etag = 'W/' + quote_etag(digest.hexdigest())
+        timestamp = (int(last_modified.timestamp())
+                     if last_modified is not None else None)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        cache_result('etag', response is not None)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # Фильтры (в том числе ранжирование по ингредиентам) применяются
+        # один раз: тот же queryset идёт и в валидаторы, и в ответ
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(
+            request, self.get_list_validators(queryset), self.list_response,
+            queryset)
+
+    def list_response(self, request, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_object_validators(), super().retrieve,
+            *args, **kwargs)
+
+
+class IdempotentWriteMixin:
+    """Повтор запроса с тем же Idempotency-Key возвращает прежний ответ.
+
+    Ответ хранится IDEMPOTENCY_KEY_TTL секунд. Тот же ключ с другим телом
+    запроса отклоняется (422), а пока первый запрос выполняется, но не
+    дольше IDEMPOTENCY_CLAIM_TTL секунд, повтор получает 409.
+    """
+
+    idempotency_header = 'Idempotency-Key'
+
+    def idempotent_response(self, request, handler, *args, **kwargs):
+        key = request.headers.get(self.idempotency_header)
+        if not key or not request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'errors': 'Слишком длинный ключ идемпотентности.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        request_fingerprint = idempotency.fingerprint(request)
+        record, created = idempotency.claim(
+            request.user, key, request_fingerprint)
+        cache_result('idempotency', not created)
+        if not created:
+            return self.replay(record, request_fingerprint)
+
+        try:
+            response = handler(request, *args, **kwargs)
+        except Exception:
+            idempotency.release(record)
+            raise
+        if response.status_code >= 500:
+            idempotency.release(record)
+        else:
+            idempotency.store(record, response)
+        return response
+
+    def replay(self, record, request_fingerprint):
+        if record is None or record.status_code is None:
+            return Response(
+                {'errors': 'Запрос с этим ключом ещё выполняется.'},
+                status=status.HTTP_409_CONFLICT)
+        if record.fingerprint != request_fingerprint:
+            return Response(
+                {'errors': 'Ключ уже использован для другого запроса.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = Response(record.response, status=record.status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def create(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            request, super().create, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            request, super().update, *args, **kwargs)
+
+
+class SparseFieldsViewMixin:
+    """Параметры fields= и expand= для GET-запросов.
+
+    Дерево полей передаётся сериализатору в context['fields'], а view
+    может по нему сократить запрос к БД.
+    """
+
+    def sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            params = self.request.query_params
+            self._sparse_fields = None
+            if self.request.method == 'GET':
+                self._sparse_fields = parse_sparse_fields(
+                    params.get('fields'), params.get('expand'))
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.sparse_fields()
+        return context
@@ -5,12 +5,114 @@ from django.core.files.base import ContentFile
 from django.db import transaction
 from rest_framework import serializers
 
-from recipes.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
-                            ShoppingCart, Tag)
+from core.media import media_url
+from core.timing import timed
+from recipes import meal_plan, shopping_list
+from recipes.models import (ExportJob, Ingredient, IngredientForRecipe,
+                            MealPlanEntry, Recipe, ShoppingListItem, Tag)
+from recipes.pantry import pantry_index
 from users.models import User, Subscription
 
 
-class Base64ImageField(serializers.ImageField):
+class TimedSerializerMixin:
+    """Учитывает время сериализации в логе запроса."""
+
+    def to_representation(self, instance):
+        with timed('serializer_ms'):
+            return super().to_representation(instance)
+
+
+class MediaImageField(serializers.ImageField):
+    """Картинка с абсолютным URL без обращения к хранилищу."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(value.name, self.context.get('request'))
+
+
+# Отметка «все поля» в дереве выбранных полей
+ALL_FIELDS = '*'
+
+
+def parse_sparse_fields(fields, expand=None):
+    """Дерево выбранных полей из параметров fields= и expand=.
+
+    fields=id,name,author.first_name - поля ответа, через точку - поля
+    вложенных объектов. Вложенный объект без уточнения отдаётся своим id,
+    expand=author - целиком. Без fields возвращает None: отдаём всё.
+    """
+    if not fields:
+        return None
+    tree = {}
+    for param, expanded in ((fields, False), (expand or '', True)):
+        for path in param.split(','):
+            names = [name for name in path.strip().split('.') if name]
+            if not names:
+                continue
+            node = tree
+            for name in names:
+                node = node.setdefault(name, {})
+            if expanded:
+                node[ALL_FIELDS] = {}
+    return tree
+
+
+def is_selected(tree, name):
+    return tree is None or ALL_FIELDS in tree or name in tree
+
+
+def subtree(tree, name):
+    """Поля вложенного объекта, None - все поля."""
+    if tree is None:
+        return None
+    return tree.get(name) or None
+
+
+def is_expanded(tree, name):
+    """Вложенный объект нужен целиком или с частью полей, а не только id."""
+    return tree is None or ALL_FIELDS in tree or bool(tree.get(name))
+
+
+class SparseFieldsMixin:
+    """Оставляет только поля, выбранные в context['fields'].
+
+    Вложенный сериализатор берёт своё поддерево по имени поля.
+    """
+
+    def get_reference_field(self, name):
+        """Поле, которым заменяется невыбранный целиком вложенный объект."""
+        return None
+
+    def sparse_fields(self):
+        tree = self.context.get('fields')
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        for name in reversed(path):
+            tree = subtree(tree, name)
+        return tree
+
+    def get_fields(self):
+        fields = super().get_fields()
+        tree = self.sparse_fields()
+        if tree is None or ALL_FIELDS in tree:
+            return fields
+        selected = {}
+        for name, field in fields.items():
+            if name not in tree:
+                continue
+            reference = None
+            if not is_expanded(tree, name):
+                reference = self.get_reference_field(name)
+            selected[name] = reference or field
+        return selected
+
+
+class Base64ImageField(MediaImageField):
     """Сериализатор для картинок."""
 
     def to_internal_value(self, data):
@@ -22,7 +124,32 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class BatchPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, объекты по которому загружаются одним запросом.
+
+    При разборе проверяется только тип значения, существование объектов
+    проверяет сериализатор через resolve().
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def resolve(self, pks):
+        """Возвращает ({pk: объект}, список отсутствующих pk)."""
+        objects = self.get_queryset().in_bulk(set(pks))
+        return objects, [pk for pk in pks if pk not in objects]
+
+    def does_not_exist(self, pk):
+        return self.error_messages['does_not_exist'].format(pk_value=pk)
+
+
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin,
+                     serializers.ModelSerializer):
     """Сериализатор пользователей."""
 
     avatar = Base64ImageField(required=False, allow_null=True)
@@ -33,7 +160,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('email', 'id', 'username',
                   'first_name', 'last_name',
-                  'is_subscribed', 'avatar', 'password')
+                  'is_subscribed', 'avatar', 'password',
+                  'recipes_count', 'followers_count', 'following_count')
+        read_only_fields = ('recipes_count', 'followers_count',
+                            'following_count')
 
     def validate(self, attrs):
         request = self.context.get('request')
@@ -55,13 +185,16 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Проверка подписки на автора."""
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context['request'].user
-        if user.is_authenticated:
+        if user.is_authenticated and user != obj:
             return Subscription.objects.filter(user=user, author=obj).exists()
         return False
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор тегов."""
 
     class Meta:
@@ -69,7 +202,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор ингредиентов."""
 
     class Meta:
@@ -80,8 +213,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientForRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиентов для рецепта."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = BatchPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     name = serializers.CharField(source='ingredient.name', read_only=True)
     measurement_unit = serializers.CharField(
         source='ingredient.measurement_unit', read_only=True)
@@ -91,7 +223,8 @@ class IngredientForRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(TimedSerializerMixin, SparseFieldsMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для метода get рецепта."""
 
     author = UserSerializer(read_only=True)
@@ -102,7 +235,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         default=False, read_only=True
     )
-    image = serializers.ImageField(required=False, allow_null=True)
+    image = MediaImageField(required=False, allow_null=True)
 
     class Meta:
         model = Recipe
@@ -111,13 +244,70 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
         )
 
+    def get_reference_field(self, name):
+        if name == 'author':
+            return serializers.ReadOnlyField(source='author_id')
+        if name == 'tags':
+            return serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True)
+        if name == 'ingredients':
+            return serializers.SerializerMethodField('get_ingredient_ids')
+        return None
+
+    def get_ingredient_ids(self, obj):
+        return [
+            {'id': item.ingredient_id, 'amount': item.amount}
+            for item in obj.recipe_ingredients.all()
+        ]
 
-class RecipeWriteSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # Подписка на автора посчитана в запросе рецептов
+        author_subscribed = getattr(instance, 'author_is_subscribed', None)
+        if author_subscribed is not None:
+            instance.author.is_subscribed = author_subscribed
+        return super().to_representation(instance)
+
+
+class RecipeCompactSerializer(RecipeReadSerializer):
+    """Рецепт со ссылками на теги и ингредиенты по id.
+
+    Описания тегов и ингредиентов страницы отдаются один раз в словарях
+    ответа, см. references().
+    """
+
+    tags = serializers.SerializerMethodField()
+    ingredients = serializers.SerializerMethodField('get_ingredient_ids')
+
+    def get_tags(self, obj):
+        return [tag.id for tag in obj.tags.all()]
+
+    @staticmethod
+    def references(recipes):
+        """Словари {id: описание} тегов и ингредиентов рецептов."""
+        tags, ingredients = {}, {}
+        for recipe in recipes:
+            for tag in recipe.tags.all():
+                tags[tag.id] = tag
+            for item in recipe.recipe_ingredients.all():
+                ingredients[item.ingredient_id] = item.ingredient
+        return {
+            'tags': {
+                tag['id']: tag
+                for tag in TagSerializer(tags.values(), many=True).data
+            },
+            'ingredients': {
+                ingredient['id']: ingredient
+                for ingredient in IngredientSerializer(
+                    ingredients.values(), many=True).data
+            },
+        }
+
+
+class RecipeWriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для методов post/patch/put/delete рецепта."""
 
     ingredients = IngredientForRecipeSerializer(many=True, write_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
+    tags = BatchPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     image = Base64ImageField(write_only=True, allow_null=True)
 
     class Meta:
@@ -138,8 +328,24 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             ingredient_objects.append(ingredient_instance)
 
         IngredientForRecipe.objects.bulk_create(ingredient_objects)
+        # bulk_create не отправляет сигналы, индекс обновляем явно
+        ingredient_ids = [obj.ingredient_id for obj in ingredient_objects]
+        transaction.on_commit(
+            lambda: pantry_index.set_recipe(recipe.pk, ingredient_ids))
 
     def validate_ingredients(self, value):
+        id_field = self.fields['ingredients'].child.fields['id']
+        ingredients, missing = id_field.resolve(
+            [item['id'] for item in value])
+        if missing:
+            raise serializers.ValidationError([
+                {'id': [id_field.does_not_exist(item['id'])]}
+                if item['id'] in missing else {}
+                for item in value
+            ])
+        for item in value:
+            item['id'] = ingredients[item['id']]
+
         if not value:
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один ингредиент.')
@@ -157,6 +363,13 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return value
 
     def validate_tags(self, value):
+        tag_field = self.fields['tags'].child_relation
+        tags, missing = tag_field.resolve(value)
+        if missing:
+            raise serializers.ValidationError(
+                tag_field.does_not_exist(missing[0]))
+        value = [tags[pk] for pk in value]
+
         if not value:
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один тег.')
@@ -185,33 +398,56 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
+        instance.image = validated_data.get('image', instance.image)
         instance.save()
         ingredients = validated_data.pop('ingredients', None)
-        instance.ingredients.clear()
-        self.create_ingredient(ingredients, instance)
+        if ingredients is not None:
+            old_amounts = shopping_list.recipe_amounts(
+                [instance.pk])[instance.pk]
+            new_amounts = {
+                item['id'].pk: item['amount'] for item in ingredients}
+            # Состав не изменился: корзины и планы пересчитывать не нужно
+            if new_amounts != old_amounts:
+                instance.ingredients.clear()
+                self.create_ingredient(ingredients, instance)
+                shopping_list.propagate_recipe_change(
+                    instance.pk, old_amounts, new_amounts)
+                # Как и сигналы плана, сбрасываем подытоги после коммита
+                recipe_id = instance.pk
+                transaction.on_commit(
+                    lambda: meal_plan.invalidate_recipe(recipe_id))
 
         tags = validated_data.pop('tags', None)
-        instance.tags.set(tags)
+        if tags is not None:
+            instance.tags.set(tags)
         return instance
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор избранных рецептов."""
+class BulkRecipeSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для массовых операций."""
 
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
 
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Короткий сериализатор для отображения рецептов."""
 
+    image = MediaImageField(read_only=True)
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор подписки на авторов."""
 
     email = serializers.ReadOnlyField(source='author.email')
@@ -221,7 +457,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(read_only=True, default=0)
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
     avatar = serializers.SerializerMethodField()
 
     class Meta:
@@ -261,7 +497,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             {
                 'id': recipe.id,
                 'name': recipe.name,
-                'image': recipe.image.url,
+                'image': media_url(recipe.image.name, request),
                 'cooking_time': recipe.cooking_time
             }
             for recipe in recipes
@@ -270,27 +506,45 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return recipes_list
 
     def get_avatar(self, obj):
-        if obj.author.avatar:
-            return f'{settings.MEDIA_URL}{obj.author.avatar}'
-        return None
+        return media_url(obj.author.avatar.name,
+                         self.context.get('request'))
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор корзины."""
+class ShoppingListSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
+    """Сериализатор списка покупок."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        source='recipe',
-        read_only=True)
-    name = serializers.ReadOnlyField(
-        source='recipe.name',
-        read_only=True)
-    image = serializers.ImageField(
-        source='recipe.image',
-        read_only=True)
-    cooking_time = serializers.IntegerField(
-        source='recipe.cooking_time',
-        read_only=True)
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
     class Meta:
-        model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time')
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class MealPlanEntrySerializer(TimedSerializerMixin,
+                              serializers.ModelSerializer):
+    """Сериализатор рецептов в плане питания."""
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ('id', 'recipe', 'date', 'servings')
+
+
+class MealPlanPeriodSerializer(serializers.Serializer):
+    """Период плана питания для списка покупок."""
+
+    start = serializers.DateField(required=False)
+    days = serializers.IntegerField(
+        min_value=1, max_value=settings.MEAL_PLAN_MAX_DAYS, default=7)
+
+
+class ExportJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Сериализатор задач выгрузки списка покупок."""
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'format', 'status', 'error', 'created_at')
+        read_only_fields = ('status', 'error', 'created_at')
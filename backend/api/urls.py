@@ -1,14 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (UserViewSet, IngredientViewSet, RecipeViewSet,
-                       TagViewSet)
+from api.views import (UserViewSet, IngredientViewSet, MealPlanViewSet,
+                       RecipeViewSet, TagViewSet)
 
 api_router = DefaultRouter()
 api_router.register('tags', TagViewSet, basename='tags')
 api_router.register('ingredients', IngredientViewSet, basename='ingredients')
 api_router.register(r'recipes', RecipeViewSet, basename='recipes')
 api_router.register(r'users', UserViewSet, basename='users')
+api_router.register(r'meal_plan', MealPlanViewSet, basename='meal_plan')
 
 
 urlpatterns_detail = [
@@ -1,31 +1,54 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db import models as d_models
-from django.http import HttpResponse
+from django.db import transaction
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser import views as djoser_views
 from djoser import serializers as djoser_serializers
+from datetime import timedelta
 from io import BytesIO
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
-                            ShoppingCart, Tag)
+from core.media import media_url
+from core.metrics import EXPORT_SIZE, SHORT_LINK_REDIRECTS
+from core.singleflight import SingleFlight
+from recipes import exports, meal_plan, recommendations, shopping_list
+from recipes.catalog import catalog, short_links
+from recipes.models import (ExportJob, Favorite, Ingredient, MealPlanEntry,
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
 from users.models import User, Subscription
-from .filters import IngredientFilter, RecipeFilter
+from .filters import IngredientFilter, MealPlanFilter, RecipeFilter
+from .mixins import (ConditionalGetMixin, IdempotentWriteMixin,
+                     SparseFieldsViewMixin)
 from .paginations import ApiPagination
 from .permissions import IsAuthAuthorOrReadonly
-from .serializers import (FavoriteSerializer, UserSerializer,
-                          IngredientSerializer,
-                          RecipeReadSerializer, RecipeWriteSerializer,
-                          ShoppingCartSerializer, ShortRecipeSerializer,
-                          SubscriptionSerializer, TagSerializer)
-
-
-class UserViewSet(djoser_views.UserViewSet):
+from .serializers import (BulkRecipeSerializer, ExportJobSerializer,
+                          UserSerializer, IngredientSerializer,
+                          MealPlanEntrySerializer, MealPlanPeriodSerializer,
+                          RecipeCompactSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer, ShoppingListSerializer,
+                          ShortRecipeSerializer,
+                          SubscriptionSerializer, TagSerializer,
+                          is_expanded, is_selected, subtree)
+
+# Поля моделей, которые можно не загружать при fields=
+USER_COLUMNS = ('email', 'username', 'first_name', 'last_name', 'avatar',
+                'recipes_count', 'followers_count', 'following_count')
+RECIPE_COLUMNS = ('author', 'name', 'image', 'text', 'cooking_time')
+
+ingredient_search_flight = SingleFlight('ingredient_search')
+subscriptions_flight = SingleFlight('subscriptions')
+shopping_list_flight = SingleFlight('shopping_list_download')
+
+
+class UserViewSet(SparseFieldsViewMixin, djoser_views.UserViewSet):
     """Вьюсет для управления пользователями."""
 
     queryset = User.objects.all()
@@ -34,6 +57,25 @@ class UserViewSet(djoser_views.UserViewSet):
     http_method_names = ('get', 'post', 'put', 'delete')
     lookup_field = 'id'
     pagination_class = ApiPagination
+    # Ограничение частоты задаётся в action
+    throttle_scope = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('id')
+        fields = self.sparse_fields()
+        if fields is not None:
+            queryset = queryset.only('id', *(
+                name for name in USER_COLUMNS if is_selected(fields, name)))
+            if not is_selected(fields, 'is_subscribed'):
+                return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(is_subscribed=d_models.Exists(
+                Subscription.objects.filter(
+                    user=user, author=d_models.OuterRef('pk'))
+            ))
+        return queryset.annotate(is_subscribed=d_models.Value(
+            False, output_field=d_models.BooleanField()))
 
     def get_permissions(self):
         if self.action in ('create', 'list', 'retrieve'):
@@ -66,12 +108,8 @@ class UserViewSet(djoser_views.UserViewSet):
                 user, data={'avatar': data}, partial=True)
             if serializer.is_valid():
                 serializer.save()
-                base_url = getattr(settings,
-                                   'DOMAIN_URL',
-                                   'http://localhost:8000'
-                                   )
                 return Response(
-                    {'avatar': f'{base_url}/{user.avatar}'},
+                    {'avatar': media_url(user.avatar.name, request)},
                     status=status.HTTP_200_OK
                 )
             return Response(serializer.errors,
@@ -79,7 +117,9 @@ class UserViewSet(djoser_views.UserViewSet):
                             )
 
         elif request.method == 'DELETE':
-            user.avatar.delete(save=True)
+            # Файл может быть общим, его удалит сигнал, если он не нужен
+            user.avatar = None
+            user.save(update_fields=('avatar', 'updated_at'))
             return Response({'detail': 'Аватар удалён.'},
                             status=status.HTTP_204_NO_CONTENT
                             )
@@ -124,28 +164,31 @@ class UserViewSet(djoser_views.UserViewSet):
 
     @action(detail=False,
             methods=['get'],
-            url_path='subscriptions')
+            url_path='subscriptions',
+            throttle_scope='subscriptions')
     def list_subscriptions(self, request):
         """Получаем свой список подписок."""
+        return Response(subscriptions_flight.do(
+            (request.user.id, request.get_full_path()),
+            self.subscriptions_data, request))
+
+    def subscriptions_data(self, request):
         user = request.user
         subscriptions = Subscription.objects.filter(
-            user=user).select_related(
-                'author').annotate(
-            recipes_count=d_models.Count('author__recipes')
-        )
+            user=user).select_related('author')
 
         page = self.paginate_queryset(subscriptions)
         if page is not None:
             serializer = SubscriptionSerializer(
                 page, many=True, context={'request': request}
             )
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializer.data).data
 
         serializer = SubscriptionSerializer(
             subscriptions, many=True, context={'request': request}
         )
 
-        return Response(serializer.data)
+        return serializer.data
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -155,6 +198,16 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
 
+    def list(self, request, *args, **kwargs):
+        return Response(catalog.tags())
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        tag = catalog.tag(int(pk)) if pk.isdigit() else None
+        if tag is None:
+            raise Http404('Тег не найден.')
+        return Response(tag)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для управления ингредиентами рецептов."""
@@ -163,137 +216,304 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
     permission_classes = (AllowAny,)
+    throttle_scope = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        # Поиск по началу названия отвечает справочник в памяти
+        if set(request.query_params) <= {'name'}:
+            return Response(catalog.search_ingredients(
+                request.query_params.get('name', '')))
+        # Одинаковые поисковые запросы выполняются один раз
+        return Response(ingredient_search_flight.do(
+            request.get_full_path(), self.search, request, *args, **kwargs))
+
+    def search(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+
+class MealPlanViewSet(viewsets.ModelViewSet):
+    """Вьюсет для плана питания текущего пользователя."""
+
+    serializer_class = MealPlanEntrySerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = ApiPagination
+    http_method_names = ('get', 'post', 'patch', 'delete')
+
+    filterset_class = MealPlanFilter
+
+    def get_queryset(self):
+        return MealPlanEntry.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['get'], url_path='shopping_list')
+    def shopping_list(self, request):
+        """Список покупок на период плана, по умолчанию текущая неделя."""
+        serializer = MealPlanPeriodSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        start = serializer.validated_data.get('start')
+        if start is None:
+            today = timezone.localdate()
+            start = today - timedelta(days=today.weekday())
+        days = serializer.validated_data['days']
+
+        amounts = meal_plan.period_totals(
+            request.user.id, start, days).as_dict()
+        ingredients = Ingredient.objects.in_bulk(amounts)
+        # Ингредиент мог быть удалён после расчёта подытогов
+        items = sorted(
+            (ShoppingListItem(ingredient=ingredients[ingredient_id],
+                              amount=amount)
+             for ingredient_id, amount in amounts.items()
+             if ingredient_id in ingredients),
+            key=lambda item: item.ingredient.name,
+        )
+        return Response({
+            'start': start,
+            'end': start + timedelta(days=days - 1),
+            'ingredients': ShoppingListSerializer(items, many=True).data,
+        })
 
 
 def handle_favorite_or_cart(request,
                             user,
-                            recipe,
-                            serializer_class,
+                            recipe_id,
                             model_class,
-                            remove_message):
+                            remove_message,
+                            exists_message):
     """Обработка добавления рецепта в избранное или корзину."""
     if request.method == 'POST':
-        serializer_context = {'request': request,
-                              'user': user}
-        serializer = serializer_class(
-            data={'user': user.id, 'recipe': recipe.id},
-            context=serializer_context
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+            pk=recipe_id
         )
-        if serializer.is_valid(raise_exception=True):
-            serializer.save(user=user, recipe=recipe)
-            return Response(ShortRecipeSerializer(recipe).data,
+        with transaction.atomic():
+            created = model_class.add(user.id, recipe.id)
+            if created and model_class is ShoppingCart:
+                shopping_list.add_recipes(user.id, [recipe.id])
+        if created:
+            serializer = ShortRecipeSerializer(
+                recipe, context={'request': request})
+            return Response(serializer.data,
                             status=status.HTTP_201_CREATED
                             )
-        return Response(serializer.errors,
+        return Response({'errors': exists_message},
                         status=status.HTTP_400_BAD_REQUEST
                         )
 
     if request.method == 'DELETE':
-        deleted_count, _ = model_class.objects.filter(
-            user=user,
-            recipe=recipe
-        ).delete()
+        with transaction.atomic():
+            deleted_count, _ = model_class.objects.filter(
+                user=user,
+                recipe_id=recipe_id
+            ).delete()
+            if deleted_count and model_class is ShoppingCart:
+                shopping_list.remove_recipes(user.id, [recipe_id])
 
         if deleted_count > 0:
             return Response(
                 {'status': remove_message},
                 status=status.HTTP_204_NO_CONTENT
             )
+        # Наличие рецепта проверяем только при неудаче
+        get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
         return Response(
             {'status': f'Не найден рецепт в {remove_message.lower()}.'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
 
-def create_shopping_list_file(user_id):
-    """Создание списка покупок для пользователя."""
-    ingredients = (
-        IngredientForRecipe.objects
-        .filter(recipe__shoppingcart_related__user_id=user_id)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(total_amount=d_models.Sum('amount'))
-    )
-    buffer = BytesIO()
-    buffer.write('Список покупок:\n\n'.encode('utf-8'))
+def handle_bulk_favorite_or_cart(request, user, model_class):
+    """Массовое добавление и удаление рецептов в избранном или корзине."""
+    serializer = BulkRecipeSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = serializer.validated_data['recipes']
+
+    # Состав изменений берётся из ответа самой БД, а не из чтения перед
+    # записью: параллельный запрос не посчитает те же рецепты второй раз
+    if request.method == 'POST':
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        with transaction.atomic():
+            added = model_class.add_many(
+                user.id, [recipe_id for recipe_id in recipe_ids
+                          if recipe_id in found])
+            if model_class is ShoppingCart:
+                shopping_list.add_recipes(user.id, added)
+        statuses = [
+            {'id': recipe_id,
+             'status': ('not_found' if recipe_id not in found
+                        else 'added' if recipe_id in added
+                        else 'exists')}
+            for recipe_id in recipe_ids
+        ]
+        return Response(statuses, status=status.HTTP_200_OK)
+
+    with transaction.atomic():
+        removed = model_class.remove_many(user.id, recipe_ids)
+        if model_class is ShoppingCart:
+            shopping_list.remove_recipes(user.id, removed)
+    statuses = [
+        {'id': recipe_id,
+         'status': 'removed' if recipe_id in removed else 'not_in_list'}
+        for recipe_id in recipe_ids
+    ]
+    return Response(statuses, status=status.HTTP_200_OK)
 
-    for item in ingredients:
-        ingredient_name = item['ingredient__name']
-        measurement_unit = item['ingredient__measurement_unit']
-        total_amount = item['total_amount']
-        line = f'- {ingredient_name}: {total_amount} {measurement_unit}\n'
-        buffer.write(line.encode('utf-8'))
 
-    buffer.seek(0)
-    return buffer
+def create_shopping_list_file(user_id):
+    """Создание списка покупок для пользователя."""
+    lines = exports.shopping_list_lines(user_id)
+    content = exports.render_txt(lines)
+    EXPORT_SIZE.labels(ExportJob.TXT).observe(len(content))
+    return BytesIO(content)
 
 
 def redirect_to_long_url(request, short_url):
     """Редирект на рецепт по короткому ссылке."""
-    recipe = get_object_or_404(Recipe, short_url=short_url)
+    recipe_id = short_links.resolve(short_url)
+    if recipe_id is None:
+        SHORT_LINK_REDIRECTS.labels('not_found').inc()
+        raise Http404('Короткая ссылка не найдена.')
+    SHORT_LINK_REDIRECTS.labels('found').inc()
     base_url = getattr(settings, 'DOMAIN_URL', 'http://localhost:8000')
-    long_url = f'{base_url}/recipes/{recipe.pk}/'
+    long_url = f'{base_url}/recipes/{recipe_id}/'
     return redirect(long_url)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+def user_versions(user):
+    """Версии избранного, корзины и подписок пользователя.
+
+    Пара (количество, максимальный id) меняется при любом добавлении
+    или удалении записи.
+    """
+    if not user.is_authenticated:
+        return ()
+    annotations = {}
+    for name, model in (('favorites', Favorite),
+                        ('cart', ShoppingCart),
+                        ('subscriptions', Subscription)):
+        related = model.objects.filter(
+            user=d_models.OuterRef('pk')).order_by().values('user')
+        annotations[f'{name}_count'] = d_models.Subquery(
+            related.annotate(value=d_models.Count('id')).values('value'))
+        annotations[f'{name}_max'] = d_models.Subquery(
+            related.annotate(value=d_models.Max('id')).values('value'))
+    return User.objects.filter(pk=user.pk).annotate(
+        **annotations).values_list(*annotations).get()
+
+
+class RecipeViewSet(IdempotentWriteMixin, ConditionalGetMixin,
+                    SparseFieldsViewMixin, viewsets.ModelViewSet):
     """Вьюсет для управления рецептами."""
 
     permission_classes = (IsAuthenticated,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = ApiPagination
+    throttle_scope = None
 
-    def get_queryset(self):
-        prefetch_subs = d_models.Prefetch(
-            'author__subscribers',
-            queryset=Subscription.objects.annotate(
-                is_subscribed=d_models.Exists(
-                    Subscription.objects.filter(
-                        author=d_models.OuterRef('author'),
-                        user=self.request.user.id,
-                    )
-                ) if self.request.user.is_authenticated else d_models.Value(
-                    False,
-                    output_field=d_models.BooleanField()
-                )
-            ),
-            to_attr='subs',
-        )
-
-        query = Recipe.objects.select_related('author').prefetch_related(
-            'recipe_ingredients__ingredient',
-            'recipe_ingredients',
-            'tags',
-            prefetch_subs,
+    def get_base_queryset(self):
+        query = Recipe.objects.all()
+        author_param = self.request.GET.get('author')
+        if author_param == 'me':
+            query = query.filter(author=self.request.user.id)
+        return query
+
+    def get_list_validators(self, queryset):
+        # values() отбрасывает аннотации избранного и подписок из подзапроса
+        state = queryset.order_by().values('pk').aggregate(
+            count=d_models.Count('id'),
+            recipe_updated=d_models.Max('updated_at'),
+            author_updated=d_models.Max('author__updated_at'),
         )
+        # Удаление рецепта не двигает max(updated_at), поэтому у списка
+        # нет Last-Modified, а число рецептов входит в ETag
+        return self._validators(
+            (state['count'], state['recipe_updated'],
+             state['author_updated']), last_modified=False)
+
+    def get_object_validators(self):
+        state = self.get_base_queryset().filter(
+            pk=self.kwargs.get('pk')
+        ).values_list('updated_at', 'author__updated_at').first()
+        if state is None:
+            return None, None
+        return self._validators(state)
+
+    def _validators(self, timestamps, last_modified=True):
+        user = self.request.user
+        etag_parts = (*timestamps, *user_versions(user))
+        # Last-Modified не отражает избранное и корзину, поэтому
+        # отдаём его только анонимным пользователям
+        if not last_modified or user.is_authenticated:
+            return etag_parts, None
+        return etag_parts, max(
+            (stamp for stamp in timestamps[-2:] if stamp), default=None)
 
-        if self.request.user.is_authenticated:
+    def get_queryset(self):
+        user = self.request.user
+        fields = None
+        if self.action in ('list', 'retrieve'):
+            fields = self.sparse_fields()
+        query = self.get_base_queryset()
+
+        if fields is not None:
+            query = query.only('id', *(
+                name for name in RECIPE_COLUMNS if is_selected(fields, name)))
+        if is_expanded(fields, 'author'):
+            query = query.select_related('author')
+        if is_expanded(fields, 'author') and is_selected(
+                subtree(fields, 'author'), 'is_subscribed'):
             query = query.annotate(
-                is_favorited=d_models.Exists(
-                    Favorite.objects.filter(
-                        user=self.request.user.id, recipe=d_models.OuterRef(
-                            'pk')
-                    )
-                ),
-                is_in_shopping_cart=d_models.Exists(
-                    ShoppingCart.objects.filter(
-                        user=self.request.user.id, recipe=d_models.OuterRef(
-                            'pk')
-                    )
-                ),
+                author_is_subscribed=d_models.Exists(
+                    Subscription.objects.filter(
+                        author=d_models.OuterRef('author'), user=user.id)
+                ) if user.is_authenticated else d_models.Value(
+                    False, output_field=d_models.BooleanField())
+            )
+        # Словари компактной схемы строятся по тегам и ингредиентам
+        # всех рецептов страницы, даже если в fields их нет
+        compact = self.is_compact()
+        if is_selected(fields, 'ingredients') or compact:
+            query = query.prefetch_related(
+                'recipe_ingredients__ingredient'
+                if is_expanded(fields, 'ingredients') or compact
+                else 'recipe_ingredients'
             )
+        if is_selected(fields, 'tags') or compact:
+            query = query.prefetch_related('tags')
 
-        author_param = self.request.GET.get('author')
-        if author_param == 'me':
-            query = query.filter(author=self.request.user.id)
+        if user.is_authenticated:
+            for name, model in (('is_favorited', Favorite),
+                                ('is_in_shopping_cart', ShoppingCart)):
+                if is_selected(fields, name):
+                    query = query.annotate(**{name: d_models.Exists(
+                        model.objects.filter(
+                            user=user.id, recipe=d_models.OuterRef('pk')))})
 
         return query.order_by('-pub_date').all()
 
+    def is_compact(self):
+        """Клиент запросил компактную схему: ?schema=compact."""
+        return (self.action == 'list'
+                and self.request.query_params.get('schema') == 'compact')
+
     def get_serializer_class(self):
+        if self.is_compact():
+            return RecipeCompactSerializer
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.is_compact():
+            response.data.update(RecipeCompactSerializer.references(
+                self.paginator.page.object_list))
+        return response
+
     def get_permissions(self):
         if self.action in ('update', 'partial_update', 'destroy'):
             return [IsAuthAuthorOrReadonly()]
@@ -308,6 +528,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Возврат данных через другой сериализатор."""
         recipe = serializer.save()
+        d_models.prefetch_related_objects(
+            [recipe], 'recipe_ingredients__ingredient', 'tags')
         read_serializer = RecipeReadSerializer(
             recipe, context=self.get_serializer_context())
         return read_serializer.data
@@ -315,6 +537,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         """Возврат данных через другой сериализатор."""
         recipe = serializer.save()
+        d_models.prefetch_related_objects(
+            [recipe], 'recipe_ingredients__ingredient', 'tags')
         read_serializer = RecipeReadSerializer(
             recipe, context=self.get_serializer_context())
         return read_serializer.data
@@ -332,21 +556,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response({'short-link': full_short_url})
 
+    @action(detail=True,
+            methods=['get'],
+            url_path='similar',
+            permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """Рецепты, которые часто добавляют вместе с этим."""
+        top_k = settings.RECOMMENDATIONS_TOP_K
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), top_k) if limit.isdigit() else top_k
+        if not pk.isdigit():
+            raise Http404('Рецепт не найден.')
+        recipe_ids = recommendations.similar_recipe_ids(pk, limit)
+        if not recipe_ids and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404('Рецепт не найден.')
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time').in_bulk(recipe_ids)
+        return Response(ShortRecipeSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True, context={'request': request}).data)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         url_path='favorite')
     def favorite(self, request, *args, **kwargs):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get('pk'))
-
         return handle_favorite_or_cart(
             request=request,
-            user=user,
-            recipe=recipe,
-            serializer_class=FavoriteSerializer,
+            user=request.user,
+            recipe_id=self.kwargs.get('pk'),
             model_class=Favorite,
-            remove_message='Рецепт удалён из избранного.'
+            remove_message='Рецепт удалён из избранного.',
+            exists_message='Рецепт уже в избранном.'
         )
 
     @action(detail=True,
@@ -355,26 +597,105 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
     def shopping_cart(self, request, pk=None):
         """Добавление и удаление рецепта в корзине."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         return handle_favorite_or_cart(
             request=request,
-            user=user,
-            recipe=recipe,
-            serializer_class=ShoppingCartSerializer,
+            user=request.user,
+            recipe_id=pk,
             model_class=ShoppingCart,
-            remove_message='Рецепт удалён из корзины.'
+            remove_message='Рецепт удалён из корзины.',
+            exists_message='Рецепт уже в корзине.'
+        )
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='favorite')
+    def favorite_bulk(self, request):
+        """Массовое добавление и удаление рецептов в избранном."""
+        return handle_bulk_favorite_or_cart(request, request.user, Favorite)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='shopping_cart')
+    def shopping_cart_bulk(self, request):
+        """Массовое добавление и удаление рецептов в корзине."""
+        return handle_bulk_favorite_or_cart(
+            request, request.user, ShoppingCart)
+
+    @action(detail=False,
+            methods=['delete'],
+            url_path='shopping_cart/clear')
+    def clear_shopping_cart(self, request):
+        """Очистка корзины одним запросом."""
+        with transaction.atomic():
+            ShoppingCart.objects.filter(user=request.user).delete()
+            shopping_list.clear(request.user.id)
+        return Response({'status': 'Корзина очищена.'},
+                        status=status.HTTP_204_NO_CONTENT
+                        )
+
+    @action(detail=False,
+            methods=['get'],
+            url_path='shopping_list')
+    def get_shopping_list(self, request):
+        """Список покупок текущего пользователя."""
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response(ShoppingListSerializer(items, many=True).data)
+
+    @action(detail=False,
+            methods=['post'],
+            url_path='shopping_list/exports',
+            throttle_scope='shopping_list')
+    def create_export(self, request):
+        """Постановка выгрузки списка покупок в очередь."""
+        serializer = ExportJobSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = exports.create_job(
+            request.user, serializer.validated_data['format'])
+        return Response(
+            ExportJobSerializer(job).data,
+            status=(status.HTTP_201_CREATED if job.status == ExportJob.DONE
+                    else status.HTTP_202_ACCEPTED)
+        )
+
+    @action(detail=False,
+            methods=['get'],
+            url_path=r'shopping_list/exports/(?P<job_id>\d+)')
+    def export_status(self, request, job_id):
+        """Статус выгрузки списка покупок."""
+        job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+        return Response(ExportJobSerializer(exports.expire_stale(job)).data)
+
+    @action(detail=False,
+            methods=['get'],
+            url_path=r'shopping_list/exports/(?P<job_id>\d+)/download')
+    def export_download(self, request, job_id):
+        """Скачивание готовой выгрузки списка покупок."""
+        job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+        if job.status != ExportJob.DONE:
+            return Response(
+                {'status': 'Выгрузка ещё не готова.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return FileResponse(
+            default_storage.open(job.file.name),
+            as_attachment=True,
+            filename=f'shopping_list.{job.format}'
         )
 
     @action(detail=False,
             methods=['get'],
-            url_path='download_shopping_cart'
+            url_path='download_shopping_cart',
+            throttle_scope='shopping_list'
             )
     def download_shopping_list(self, request):
         """Скачивание корзины в файл."""
         user_id = request.user.id
-        shopping_list_buffer = create_shopping_list_file(user_id)
-        response = HttpResponse(shopping_list_buffer,
+        # Повторные нажатия во время подготовки получат тот же файл
+        content = shopping_list_flight.do(
+            user_id, create_shopping_list_file, user_id).getvalue()
+        response = HttpResponse(content,
                                 content_type='text/plain; charset=utf-8')
         response['Content-Disposition'] = (
             'attachment;filename="shopping_list.txt"')
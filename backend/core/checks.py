@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_replica_cache(app_configs, **kwargs):
+    """С репликами отметки записи хранятся в кеше, общем для воркеров."""
+    if not settings.REPLICA_DATABASES:
+        return []
+    alias = settings.REPLICA_CACHE_ALIAS
+    if not isinstance(caches[alias], (LocMemCache, DummyCache)):
+        return []
+    return [Error(
+        f'Кеш {alias!r} не общий для воркеров: после записи клиент может '
+        'прочитать устаревшие данные с реплики.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например memcached '
+             'или django.core.cache.backends.db.DatabaseCache.',
+        id='core.E001',
+    )]
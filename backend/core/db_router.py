@@ -0,0 +1,48 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+_state = contextvars.ContextVar('replica_state', default=None)
+
+
+def start():
+    """Начинает маршрутизацию запросов к БД для текущего HTTP-запроса."""
+    state = {'replica': None, 'wrote': False}
+    return _state.set(state), state
+
+
+def stop(token):
+    _state.reset(token)
+
+
+def use_replica():
+    """Чтения до конца запроса идут на случайную реплику."""
+    state = _state.get()
+    if state is not None and settings.REPLICA_DATABASES:
+        state['replica'] = random.choice(settings.REPLICA_DATABASES)
+
+
+class ReplicaRouter:
+    """Чтения из разрешённых view на реплики, всё остальное на default.
+
+    После первой записи чтения текущего запроса тоже идут на default.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state['wrote']:
+            return None
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
@@ -0,0 +1,63 @@
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from core.management.commands.request_log_report import percentile
+
+
+class Command(BaseCommand):
+    help = 'Нагрузка на URL с N параллельными соединениями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--header', action='append', default=[],
+                            help='Заголовок вида "Name: value"')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        path = url.path + (f'?{url.query}' if url.query else '')
+        headers = dict(
+            header.split(': ', 1) for header in options['header'])
+        deadline = time.monotonic() + options['duration']
+        latencies, errors = [], []
+
+        def worker():
+            connection = http.client.HTTPConnection(url.netloc, timeout=30)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    errors.append(None)
+                    connection.close()
+                    continue
+                if response.status >= 400:
+                    errors.append(response.status)
+                latencies.append((time.perf_counter() - started) * 1000)
+            connection.close()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(options['concurrency'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        if not latencies:
+            self.stdout.write(f'Нет ответов, ошибок: {len(errors)}')
+            return
+        self.stdout.write(
+            f'{len(latencies) / elapsed:.1f} запросов/с, '
+            f'p50 {percentile(latencies, 0.5):.1f} мс, '
+            f'p95 {percentile(latencies, 0.95):.1f} мс, '
+            f'p99 {percentile(latencies, 0.99):.1f} мс, '
+            f'ошибок: {len(errors)}')
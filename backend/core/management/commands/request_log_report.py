@@ -0,0 +1,62 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = 'Сводка по логу запросов: медленные эндпоинты и запросы к БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы лога')
+        parser.add_argument('--top', type=int, default=10)
+
+    def handle(self, *args, **options):
+        endpoints = defaultdict(list)
+        queries = defaultdict(list)
+        for path in options['paths']:
+            with open(path, encoding='utf-8') as log_file:
+                for line in log_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    event = record.get('event')
+                    if event == 'request':
+                        key = (record['method'], record['view'],
+                               record['action'])
+                        endpoints[key].append(record)
+                    elif event == 'slow_query':
+                        queries[record['sql']].append(record['ms'])
+
+        top = options['top']
+        self.stdout.write(f'Топ-{top} эндпоинтов по суммарному времени:')
+        rows = sorted(
+            endpoints.items(),
+            key=lambda item: -sum(r['total_ms'] for r in item[1]))
+        for (method, view, action), records in rows[:top]:
+            total = [r['total_ms'] for r in records]
+            average = {
+                field: sum(r[field] for r in records) / len(records)
+                for field in ('db_ms', 'queries', 'serializer_ms')
+            }
+            self.stdout.write(
+                f'{method} {view}.{action}: {len(records)} запросов, '
+                f'p50 {percentile(total, 0.5):.1f} мс, '
+                f'p95 {percentile(total, 0.95):.1f} мс, '
+                f'БД {average["db_ms"]:.1f} мс, '
+                f'запросов к БД {average["queries"]:.1f}, '
+                f'сериализация {average["serializer_ms"]:.1f} мс'
+            )
+
+        self.stdout.write(f'\nТоп-{top} медленных запросов к БД:')
+        rows = sorted(queries.items(), key=lambda item: -sum(item[1]))
+        for sql, timings in rows[:top]:
+            self.stdout.write(
+                f'{len(timings)} раз, всего {sum(timings):.1f} мс, '
+                f'max {max(timings):.1f} мс: {sql[:300]}')
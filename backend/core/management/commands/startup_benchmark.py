@@ -0,0 +1,65 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+
+MARKER = 'startup_benchmark:'
+
+# Выполняется в отдельном процессе, чтобы мерить холодный старт
+CHILD = f'MARKER = {MARKER!r}\n' + '''
+import json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+result = {'import_ms': (time.perf_counter() - started) * 1000}
+if sys.argv[1] == 'warm':
+    from recipes.warmup import warmup
+    result['warmup_ms'] = warmup()['total']
+from django.test import Client
+client = Client(HTTP_HOST='localhost')
+for path in sys.argv[2:]:
+    request_started = time.perf_counter()
+    client.get(path)
+    result[path] = (time.perf_counter() - request_started) * 1000
+print(MARKER + json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Время старта процесса и первых запросов без прогрева и с ним'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        paths = ['/api/tags/', '/api/ingredients/?name=а',
+                 '/api/recipes/?limit=10']
+        short_url = Recipe.objects.filter(
+            short_url__isnull=False).values_list('short_url', flat=True)
+        short_url = short_url.first()
+        if short_url:
+            paths.append(f'/s/{short_url}')
+
+        for mode in ('cold', 'warm'):
+            runs = [self.run_child(mode, paths)
+                    for _ in range(options['runs'])]
+            self.stdout.write(f'{mode}:')
+            for key in runs[0]:
+                median = statistics.median(run[key] for run in runs)
+                self.stdout.write(f'  {key}: {median:.1f} мс')
+
+    def run_child(self, mode, paths):
+        env = {**os.environ, 'WARMUP_ENABLED': 'true'}
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, mode, *paths],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        for line in result.stdout.splitlines():
+            if line.startswith(MARKER):
+                return json.loads(line[len(MARKER):])
+        raise CommandError(result.stderr or 'Нет результата замера.')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+
+ABSOLUTE_PREFIXES = ('http://', 'https://', '//')
+
+
+def media_prefix(request=None):
+    """Абсолютный адрес каталога медиафайлов.
+
+    MEDIA_URL с хостом (CDN) используется как есть, иначе адрес строится
+    по запросу один раз и запоминается на нём.
+    """
+    if settings.MEDIA_URL.startswith(ABSOLUTE_PREFIXES):
+        return settings.MEDIA_URL
+    if request is None:
+        return f'{settings.DOMAIN_URL}{settings.MEDIA_URL}'
+    prefix = getattr(request, '_media_prefix', None)
+    if prefix is None:
+        prefix = request.build_absolute_uri(settings.MEDIA_URL)
+        request._media_prefix = prefix
+    return prefix
+
+
+def media_url(name, request=None):
+    """Абсолютный URL файла по его имени в хранилище."""
+    if not name:
+        return None
+    return media_prefix(request) + filepath_to_uri(name)
@@ -0,0 +1,94 @@
+import os
+import resource
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_latency_seconds',
+    'Время обработки запроса',
+    ('view', 'action', 'method'),
+)
+REQUESTS = Counter(
+    'foodgram_requests_total',
+    'Количество запросов',
+    ('view', 'action', 'method', 'status'),
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Количество запросов к БД за один HTTP-запрос',
+    ('view', 'action'),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, float('inf')),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кешам: hit или miss',
+    ('cache', 'result'),
+)
+SHORT_LINK_REDIRECTS = Counter(
+    'foodgram_short_link_redirects_total',
+    'Переходы по коротким ссылкам',
+    ('result',),
+)
+THROTTLED = Counter(
+    'foodgram_throttled_requests_total',
+    'Запросы, отклонённые ограничением частоты',
+    ('scope',),
+)
+EXPORT_SIZE = Histogram(
+    'foodgram_shopping_list_export_bytes',
+    'Размер выгрузки списка покупок',
+    ('format',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float('inf')),
+)
+
+# liveall: значения по каждому живому воркеру, умершие убирает child_exit
+WORKER_REQUESTS = Gauge(
+    'foodgram_worker_requests',
+    'Запросов обработано воркером с момента запуска',
+    multiprocess_mode='liveall',
+)
+WORKER_MAX_RSS = Gauge(
+    'foodgram_worker_max_rss_bytes',
+    'Пиковый объём памяти воркера',
+    multiprocess_mode='liveall',
+)
+WORKER_EXITS = Counter(
+    'foodgram_worker_exits_total',
+    'Завершения воркеров gunicorn, включая перезапуск по max_requests',
+)
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_request(view, action, method, status, seconds, queries):
+    view = view or 'unknown'
+    action = action or ''
+    REQUEST_LATENCY.labels(view, action, method).observe(seconds)
+    REQUESTS.labels(view, action, method, status).inc()
+    DB_QUERIES.labels(view, action).observe(queries)
+
+
+def observe_worker(requests):
+    WORKER_REQUESTS.set(requests)
+    # ru_maxrss в Linux в килобайтах
+    WORKER_MAX_RSS.set(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus.
+
+    При нескольких воркерах gunicorn значения собираются из общего
+    каталога PROMETHEUS_MULTIPROC_DIR.
+    """
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
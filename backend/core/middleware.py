@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from core import db_router, timing
+from core.metrics import observe_request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+request_logger = logging.getLogger('foodgram.requests')
+slow_query_logger = logging.getLogger('foodgram.slow_queries')
+
+accepts_brotli = re.compile(r'\bbr\b').search
+
+
+def view_info(request):
+    """Имя view и действие DRF для записи в лог."""
+    match = request.resolver_match
+    if match is None:
+        return None, None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.url_name or match._func_path, None
+    actions = getattr(match.func, 'actions', None) or {}
+    return view_class.__name__, actions.get(request.method.lower())
+
+
+class RequestLogMiddleware:
+    """Пишет по строке JSON на запрос: время, БД, сериализация."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_QUERY_MS', 200)
+
+    def __call__(self, request):
+        token, metrics = timing.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                query_timer = timing.QueryTimer(metrics, self.slow_ms)
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(query_timer))
+                response = self.get_response(request)
+        finally:
+            timing.stop(token)
+
+        elapsed = time.perf_counter() - started
+        view, action = view_info(request)
+        observe_request(view, action, request.method, response.status_code,
+                        elapsed, metrics['queries'])
+        record = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'action': action,
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 2),
+            'db_ms': round(metrics['db_ms'], 2),
+            'queries': metrics['queries'],
+            'serializer_ms': round(metrics['serializer_ms'], 2),
+        }
+        request_logger.info(json.dumps(record, ensure_ascii=False))
+        for query in metrics['slow_queries']:
+            slow_query_logger.warning(json.dumps(
+                {'event': 'slow_query', 'view': view, 'action': action,
+                 **query},
+                ensure_ascii=False))
+        return response
+
+
+def view_path(view_func):
+    """Полное имя класса view или функции."""
+    view = getattr(view_func, 'cls', view_func)
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения из REPLICA_VIEWS на реплики БД.
+
+    Клиент, который только что писал в базу или вошёл, ещё
+    REPLICA_STICKY_SECONDS читает с основной: отметка хранится в cookie
+    и в общем кеше REPLICA_CACHE_ALIAS по заголовку Authorization.
+    """
+
+    cookie_name = 'db_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(settings.REPLICA_VIEWS)
+        self.sticky_seconds = settings.REPLICA_STICKY_SECONDS
+        self.cache = caches[settings.REPLICA_CACHE_ALIAS]
+
+    def __call__(self, request):
+        token, state = db_router.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.stop(token)
+        if settings.REPLICA_DATABASES and (
+                state['wrote']
+                or hasattr(request, 'db_primary_authorization')):
+            self.pin(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD', 'OPTIONS')
+                and view_path(view_func) in self.views
+                and not self.is_pinned(request)):
+            db_router.use_replica()
+
+    def pin_key(self, request):
+        # После входа токен ещё не пришёл в заголовке, его знает сигнал
+        authorization = getattr(
+            request, 'db_primary_authorization',
+            request.META.get('HTTP_AUTHORIZATION'))
+        if not authorization:
+            return None
+        digest = hashlib.sha1(authorization.encode('utf-8')).hexdigest()
+        return f'db_primary_{digest}'
+
+    def is_pinned(self, request):
+        if self.cookie_name in request.COOKIES:
+            return True
+        key = self.pin_key(request)
+        return key is not None and self.cache.get(key) is not None
+
+    def pin(self, request, response):
+        response.set_cookie(self.cookie_name, '1',
+                            max_age=self.sticky_seconds, httponly=True,
+                            samesite='Lax')
+        key = self.pin_key(request)
+        if key is not None:
+            self.cache.set(key, True, self.sticky_seconds)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов по Accept-Encoding.
+
+    Brotli, если клиент его принимает и установлен пакет brotli,
+    иначе gzip.
+    """
+
+    def process_response(self, request, response):
+        if (brotli is None or response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content) < 200
+                or not accepts_brotli(
+                    request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(
+            response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
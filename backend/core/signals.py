@@ -0,0 +1,15 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+
+@receiver(user_logged_in)
+def pin_new_token(sender, request, user, **kwargs):
+    """Запрос входа идёт без Authorization: отметку ставим на новый токен.
+
+    Следующие запросы с этим токеном ещё REPLICA_STICKY_SECONDS читают
+    с основной БД.
+    """
+    token = getattr(user, 'auth_token', None)
+    if token is not None:
+        request = getattr(request, '_request', request)
+        request.db_primary_authorization = f'Token {token.key}'
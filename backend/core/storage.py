@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """Файлы картинок получают имя по хешу содержимого.
+
+    Под одним URL всегда одно и то же содержимое, поэтому nginx и CDN
+    могут кешировать такие файлы бессрочно. Одинаковые картинки хранятся
+    одним файлом: повторная запись пропускается, файл удаляется, когда на
+    него не остаётся ссылок (recipes.images).
+    """
+
+    hashed_dirs = ('recipes/', 'users/')
+
+    def hashed_name(self, name, content):
+        dirname, basename = os.path.split(name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        extension = os.path.splitext(basename)[1].lower()
+        return os.path.join(dirname, digest.hexdigest()[:32] + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name.startswith(self.hashed_dirs):
+            name = self.hashed_name(name, content)
+            if self.exists(name):
+                # Обновляем время изменения, чтобы сборщик мусора не удалил
+                # файл до сохранения объекта, который на него ссылается
+                os.utime(self.path(name))
+                return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import ScopedRateThrottle
+
+from core.metrics import THROTTLED
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def refill(state, capacity, rate, now):
+    """Число токенов в корзине на момент now."""
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def take(tokens, rate):
+    """(разрешено, остаток токенов, сколько ждать до следующего)."""
+    if tokens >= 1:
+        return True, tokens - 1, 0
+    return False, tokens, (1 - tokens) / rate
+
+
+class LocalBucketStore:
+    """Корзины токенов в памяти процесса.
+
+    Лимит общий для потоков одного воркера; при нескольких воркерах
+    каждый считает запросы отдельно.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or settings.THROTTLE_LOCAL_MAX_KEYS
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens = refill(self.buckets.pop(key, None), capacity, rate, now)
+            allowed, tokens, wait = take(tokens, rate)
+            self.buckets[key] = (tokens, now)
+            # Давно не обновлявшиеся корзины всё равно полные
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+
+class CacheBucketStore:
+    """Корзины токенов в кеше Django, общие для всех воркеров.
+
+    Чтение и запись не атомарны: при гонке возможен небольшой перерасход
+    лимита, зато не нужны блокировки.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.THROTTLE_CACHE_ALIAS]
+
+    def consume(self, key, capacity, rate):
+        now = time.time()
+        tokens = refill(self.cache.get(key), capacity, rate, now)
+        allowed, tokens, wait = take(tokens, rate)
+        self.cache.set(key, (tokens, now), timeout=int(capacity / rate) + 1)
+        return allowed, wait
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """Ограничение по корзине токенов для view с throttle_scope.
+
+    Ставка вида '10/min' задаёт ёмкость корзины и скорость пополнения.
+    Для областей без ставки ограничение не применяется.
+    """
+
+    scope_suffix = ''
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if not scope:
+            return True
+        self.scope = scope + self.scope_suffix
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        allowed, self.retry_after = get_store().consume(
+            self.key, self.num_requests, self.num_requests / self.duration)
+        if not allowed:
+            THROTTLED.labels(self.scope).inc()
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Корзина на пользователя, ставка DEFAULT_THROTTLE_RATES[scope]."""
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return f'throttle_{self.scope}_user_{request.user.pk}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Корзина на IP, ставка DEFAULT_THROTTLE_RATES[scope + '_ip']."""
+
+    scope_suffix = '_ip'
+
+    def get_cache_key(self, request, view):
+        return f'throttle_{self.scope}_{self.get_ident(request)}'
@@ -0,0 +1,82 @@
+import contextvars
+import hashlib
+import re
+import time
+from contextlib import contextmanager
+
+_metrics = contextvars.ContextVar('request_metrics', default=None)
+_depth = contextvars.ContextVar('timing_depth', default=0)
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_NUMBERS = re.compile(r'\b\d+\b')
+
+
+def start():
+    """Начинает сбор метрик текущего запроса."""
+    metrics = {'db_ms': 0.0, 'queries': 0, 'serializer_ms': 0.0,
+               'slow_queries': []}
+    return _metrics.set(metrics), metrics
+
+
+def stop(token):
+    _metrics.reset(token)
+
+
+def current():
+    return _metrics.get()
+
+
+def add(name, seconds):
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics[name] += seconds * 1000
+
+
+@contextmanager
+def timed(name):
+    """Учитывает время блока, вложенные замеры не суммируются."""
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        if depth == 0:
+            add(name, time.perf_counter() - started)
+
+
+def fingerprint_sql(sql):
+    """Форма запроса без конкретных значений."""
+    sql = _IN_LIST.sub('(...)', sql)
+    return ' '.join(_NUMBERS.sub('N', sql).split())
+
+
+def fingerprint_params(params):
+    if not params:
+        return None
+    return hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:12]
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: время и число запросов к БД."""
+
+    def __init__(self, metrics, slow_ms):
+        self.metrics = metrics
+        self.slow_ms = slow_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.metrics['db_ms'] += elapsed
+            self.metrics['queries'] += 1
+            if elapsed >= self.slow_ms:
+                self.metrics['slow_queries'].append({
+                    'sql': fingerprint_sql(sql),
+                    'params': fingerprint_params(params),
+                    'ms': round(elapsed, 2),
+                    'db': context['connection'].alias,
+                })
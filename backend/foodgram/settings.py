@@ -26,12 +26,16 @@ INSTALLED_APPS = [
     'djoser',
     'rest_framework.authtoken',
     'api.apps.ApiConfig',
+    'core.apps.CoreConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
 
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestLogMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,8 +76,70 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=replica1,replica2
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Чтения этих view идут на реплики
+REPLICA_VIEWS = (
+    'api.views.RecipeViewSet',
+    'api.views.TagViewSet',
+    'api.views.IngredientViewSet',
+    'api.views.redirect_to_long_url',
+)
+# Сколько секунд после записи клиент читает с основной БД
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+# Отметки «читать с основной» должны быть видны всем воркерам, поэтому
+# с репликами нужен общий кеш (memcached, DatabaseCache), см. core.checks
+REPLICA_CACHE_ALIAS = 'default'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_USER_MODEL = 'users.User'
 
+# Запросы к БД дольше порога попадают в лог медленных запросов
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))
+REQUEST_LOG_FILE = os.getenv('REQUEST_LOG_FILE')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_line',
+        },
+        'request_file': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': REQUEST_LOG_FILE,
+            'formatter': 'json_line',
+        } if REQUEST_LOG_FILE else {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'foodgram': {
+            'handlers': ['console', 'request_file'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,8 +168,12 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
-MEDIA_URL = '/media/'
+# MEDIA_CDN_URL=https://cdn.example.com/media/ - отдавать файлы через CDN
+MEDIA_URL = os.getenv('MEDIA_CDN_URL', '/media/')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'core.storage.HashedMediaStorage'
+# Файлы картинок моложе этого срока (секунды) не удаляются как ненужные
+IMAGE_GC_GRACE = int(os.getenv('IMAGE_GC_GRACE', 3600))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -115,9 +185,38 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
     ),
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.IPTokenBucketThrottle',
+    ),
+    # Ставки для view с throttle_scope, суффикс _ip - лимит на адрес
+    'DEFAULT_THROTTLE_RATES': {
+        'shopping_list': os.getenv('THROTTLE_SHOPPING_LIST', '10/min'),
+        'shopping_list_ip': os.getenv('THROTTLE_SHOPPING_LIST_IP', '30/min'),
+        'subscriptions': os.getenv('THROTTLE_SUBSCRIPTIONS', '60/min'),
+        'subscriptions_ip': os.getenv('THROTTLE_SUBSCRIPTIONS_IP', '120/min'),
+        'ingredients': os.getenv('THROTTLE_INGREDIENTS', '120/min'),
+        'ingredients_ip': os.getenv('THROTTLE_INGREDIENTS_IP', '300/min'),
+    },
+    # Перед приложением стоит nginx
+    'NUM_PROXIES': 1,
 }
 
+# Уровень сжатия brotli (0-11), если установлен пакет brotli
+BROTLI_QUALITY = 5
+
+# Хранилище корзин ограничения частоты: в памяти воркера или
+# core.throttling.CacheBucketStore для общего кеша (Redis, memcached)
+THROTTLE_STORE = os.getenv(
+    'THROTTLE_STORE', 'core.throttling.LocalBucketStore')
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'PERMISSIONS': {
@@ -138,3 +237,43 @@ DJOSER = {
 DOMAIN_URL = 'https://foodkatya.zapto.org'
 
 PAGE_SIZE = 5
+
+# Индекс «ингредиент -> рецепты» для поиска по имеющимся продуктам
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 300))
+PANTRY_MAX_RESULTS = 500
+
+# Максимум рецептов в одном запросе массового добавления/удаления
+BULK_RECIPES_LIMIT = 100
+
+# Самый длинный период плана питания в одном списке покупок, дней
+MEAL_PLAN_MAX_DAYS = 31
+
+# Похожие рецепты: сколько хранить на рецепт, минимум общих
+# пользователей, пользователи с большими корзинами не учитываются,
+# для популярных рецептов берутся последние RECOMMENDATIONS_MAX_FANS
+# пользователей каждого сигнала (избранное, корзина) по id записи
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_MIN_COMMON = 2
+RECOMMENDATIONS_MAX_BASKET = 500
+RECOMMENDATIONS_MAX_FANS = 5000
+
+# Фоновая выгрузка списков покупок
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+EXPORT_JOB_TIMEOUT = 600
+EXPORT_PDF_FONT = os.getenv(
+    'EXPORT_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+# Сколько хранить ответы на запросы с заголовком Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# Сколько ключ считается занятым запросом, который ещё не ответил:
+# больше таймаута воркера gunicorn
+IDEMPOTENCY_CLAIM_TTL = int(os.getenv('IDEMPOTENCY_CLAIM_TTL', 120))
+
+# Теги и ингредиенты в памяти процесса, секунд до перечитывания
+CATALOG_TTL = int(os.getenv('CATALOG_TTL', 300))
+# Сколько последних коротких ссылок держать в памяти
+SHORT_LINK_INDEX_SIZE = int(os.getenv('SHORT_LINK_INDEX_SIZE', 10000))
+# Через сколько секунд ссылка из памяти перепроверяется по БД
+SHORT_LINK_TTL = int(os.getenv('SHORT_LINK_TTL', 300))
+# Прогрев справочников и индексов при старте воркера gunicorn
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').strip().lower() == 'true'
@@ -4,10 +4,12 @@ from django.contrib import admin
 from django.urls import include, path
 
 from api.views import redirect_to_long_url
+from core.metrics import metrics_view
 
 urlpatterns = [
     path('s/<str:short_url>', redirect_to_long_url,
          name='redirect_to_long_url'),
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 
@@ -0,0 +1,144 @@
+"""Настройки gunicorn: gunicorn --config gunicorn.conf.py
+
+Число воркеров и потоков подбирается по CPU и памяти контейнера,
+тип воркера задаёт профиль GUNICORN_PROFILE. Любое значение можно
+переопределить переменной окружения.
+"""
+import glob
+import math
+import os
+
+from prometheus_client import multiprocess
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def cpu_count():
+    """Доступные процессу ядра с учётом квоты cgroup."""
+    count = len(os.sched_getaffinity(0))
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+    except (OSError, ValueError):
+        return count
+    if quota == 'max':
+        return count
+    return max(1, min(count, math.ceil(int(quota) / int(period))))
+
+
+def memory_limit():
+    """Память контейнера в байтах: лимит cgroup или вся память машины."""
+    for path in ('/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        # Без лимита cgroup v1 отдаёт огромное число
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+# workers_per_cpu и extra_workers: воркеров на ядро и сверх того
+PROFILES = {
+    # Процесс на запрос: простой и предсказуемый, но много памяти
+    'sync': {
+        'worker_class': 'sync',
+        'threads': 1,
+        'workers_per_cpu': 2,
+        'extra_workers': 1,
+        'app': 'foodgram.wsgi:application',
+    },
+    # Потоки ждут БД и сеть, пока другой поток держит GIL
+    'gthread': {
+        'worker_class': 'gthread',
+        'threads': 4,
+        'workers_per_cpu': 1,
+        'extra_workers': 1,
+        'app': 'foodgram.wsgi:application',
+    },
+    # Нужен uvicorn; синхронные view Django выполняются в пуле потоков
+    'asgi': {
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'threads': 1,
+        'workers_per_cpu': 1,
+        'extra_workers': 1,
+        'app': 'foodgram.asgi:application',
+    },
+}
+
+profile_name = os.getenv('GUNICORN_PROFILE', 'gthread')
+profile = PROFILES[profile_name]
+
+# Прогретый воркер с индексами занимает около 100 МБ, запас на рост
+worker_memory = env_int('GUNICORN_WORKER_MEMORY_MB', 200) * 1024 * 1024
+cpus = cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+wsgi_app = profile['app']
+worker_class = profile['worker_class']
+threads = env_int('GUNICORN_THREADS', profile['threads'])
+workers = env_int('GUNICORN_WORKERS', max(1, min(
+    cpus * profile['workers_per_cpu'] + profile['extra_workers'],
+    memory_limit() * 3 // 4 // worker_memory,
+)))
+
+# Воркер перезапускается после max_requests запросов, чтобы рост памяти
+# не копился; разброс не даёт всем воркерам уйти на перезапуск разом
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# За nginx соединения переиспользуются
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# С preload приложение загружается и прогревается один раз в мастере,
+# воркеры получают его память после fork без копирования
+preload_app = os.getenv(
+    'GUNICORN_PRELOAD', 'false').strip().lower() == 'true'
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска дали бы счётчики, которые только
+    # растут между перезапусками контейнера, и процессы с чужими pid
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+            os.remove(path)
+    server.log.info(
+        'profile %s: %s x%s workers, %s threads, %s CPU',
+        profile_name, worker_class, workers, threads, cpus)
+
+
+def when_ready(server):
+    if preload_app:
+        from recipes.warmup import warmup
+        warmup(freeze=True)
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from recipes.warmup import warmup
+        warmup()
+
+
+def post_request(worker, req, environ, resp):
+    from core.metrics import observe_worker
+    observe_worker(worker.nr)
+
+
+def worker_exit(server, worker):
+    from core.metrics import WORKER_EXITS
+    WORKER_EXITS.inc()
+
+
+def child_exit(server, worker):
+    # Мастер не загружает Django, убираем метрики умершего воркера сам
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
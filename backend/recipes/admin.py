@@ -1,9 +1,13 @@
 from django.contrib import admin
-from django.db.models import Prefetch
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
 
+from core.admin import InputFilter, LargeTableAdminMixin
+from . import meal_plan, shopping_list
 from .models import (Favorite,
                      Ingredient,
                      IngredientForRecipe,
+                     MealPlanEntry,
                      Recipe,
                      ShoppingCart,
                      Tag)
@@ -25,39 +29,65 @@ class IngredientAdmin(admin.ModelAdmin):
 class IngredientsInline(admin.TabularInline):
     model = IngredientForRecipe
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (username)'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class UserFilter(InputFilter):
+    title = 'пользователю (username)'
+    parameter_name = 'user'
+    lookup = 'user__username'
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'author', 'total_favorites', 'short_url')
-    list_filter = ('author__first_name', 'tags__slug')
+    list_filter = (AuthorFilter, 'tags')
     search_fields = ('name',)
     inlines = [IngredientsInline]
-    autocomplete_fields = ('ingredients', 'tags')
+    autocomplete_fields = ('author', 'tags')
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request).select_related('author')
-        queryset = queryset.prefetch_related(
-            'tags',
-            Prefetch(
-                'recipe_ingredients',
-                queryset=IngredientForRecipe.objects
-                .select_related('ingredient'))
+        # Подзапрос считается только для строк текущей страницы
+        favorites = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            total=Count('id')
+        ).values('total')
+        return queryset.annotate(
+            favorites_count=Subquery(favorites)
         )
 
-        return queryset
+    def save_related(self, request, form, formsets, change):
+        """Перенос изменений состава рецепта в списки покупок."""
+        recipe_id = form.instance.pk
+        old_amounts = shopping_list.recipe_amounts([recipe_id])[recipe_id]
+        super().save_related(request, form, formsets, change)
+        new_amounts = shopping_list.recipe_amounts([recipe_id])[recipe_id]
+        shopping_list.propagate_recipe_change(
+            recipe_id, old_amounts, new_amounts)
+        transaction.on_commit(lambda: meal_plan.invalidate_recipe(recipe_id))
 
     def total_favorites(self, obj):
         """Отображает сколько раз добавили в избранное рецептов."""
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count or 0
 
     total_favorites.short_description = 'Всего добавлено в избранное'
+    total_favorites.admin_order_field = 'favorites_count'
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_filter = (UserFilter,)
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request).select_related(
@@ -67,12 +97,39 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_filter = (UserFilter,)
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request).select_related(
             'user', 'recipe'
         )
         return queryset
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        shopping_list.rebuild(
+            {obj.user_id, form.initial.get('user', obj.user_id)})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        shopping_list.rebuild([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        shopping_list.rebuild(user_ids)
+
+
+@admin.register(MealPlanEntry)
+class MealPlanEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'date', 'recipe', 'servings')
+    list_filter = (UserFilter,)
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'recipe')
@@ -0,0 +1,68 @@
+"""Суммирование количеств ингредиентов без обращений к БД.
+
+Строки приходят тремя параллельными последовательностями:
+id ингредиентов, единицы измерения и количества. Единица определяется
+ингредиентом, поэтому суммы группируются по id; если единицы не нужны,
+вместо них можно передать None.
+"""
+from collections import defaultdict
+
+
+class Totals:
+    """Суммы по ингредиентам в словаре с ключом id ингредиента.
+
+    Количества могут быть отрицательными, когда рецепты вычитаются.
+    """
+
+    def __init__(self):
+        self.amounts = defaultdict(int)
+        self.units = {}
+
+    def add(self, ingredient_ids, units, amounts, scale=1):
+        """Прибавляет строки, умножая количества на scale."""
+        if not ingredient_ids:
+            return self
+        if units is not None:
+            self.units.update(zip(ingredient_ids, units))
+        else:
+            self.units = {**dict.fromkeys(ingredient_ids), **self.units}
+        totals = self.amounts
+        if scale == 1:
+            for ingredient_id, amount in zip(ingredient_ids, amounts):
+                totals[ingredient_id] += amount
+        else:
+            for ingredient_id, amount in zip(ingredient_ids, amounts):
+                totals[ingredient_id] += amount * scale
+        return self
+
+    def merge(self, other, scale=1):
+        """Прибавляет другие суммы, например подытог за день."""
+        ingredient_ids = list(other.amounts)
+        return self.add(
+            ingredient_ids,
+            [other.units[ingredient_id] for ingredient_id in ingredient_ids],
+            [other.amounts[ingredient_id] for ingredient_id in ingredient_ids],
+            scale,
+        )
+
+    def items(self):
+        """Ненулевые суммы по возрастанию id: (id, единица, количество)."""
+        return [
+            (ingredient_id, self.units[ingredient_id], amount)
+            for ingredient_id, amount in sorted(self.amounts.items())
+            if amount
+        ]
+
+    def as_dict(self):
+        return {
+            ingredient_id: amount
+            for ingredient_id, _, amount in self.items()
+        }
+
+
+def columns(rows, width=3):
+    """Строки, например (id, единица, количество), -> последовательности."""
+    rows = list(rows)
+    if not rows:
+        return ((),) * width
+    return tuple(zip(*rows))
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from django.conf import settings
+
+from core.metrics import cache_result
+
+
+class Catalog:
+    """Теги и ингредиенты в памяти процесса.
+
+    Справочники меняются редко: при правке в этом процессе кеш
+    сбрасывается сигналом, остальные воркеры перечитывают его через
+    CATALOG_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._loaded_at = None
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CATALOG_TTL', 300)
+
+    def load(self):
+        from recipes.models import Ingredient, Tag
+
+        tags = list(Tag.objects.values('id', 'name', 'slug'))
+        ingredients = list(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'))
+        data = {
+            'tags': tags,
+            'tags_by_id': {tag['id']: tag for tag in tags},
+            'ingredients': [
+                (ingredient['name'].lower(), ingredient)
+                for ingredient in ingredients
+            ],
+        }
+        with self._lock:
+            self._data = data
+            self._loaded_at = time.monotonic()
+        return data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def get(self):
+        data = self._data
+        fresh = data is not None and (
+            time.monotonic() - self._loaded_at <= self.ttl)
+        cache_result('catalog', fresh)
+        if not fresh:
+            data = self.load()
+        return data
+
+    def tags(self):
+        return self.get()['tags']
+
+    def tag(self, tag_id):
+        return self.get()['tags_by_id'].get(tag_id)
+
+    def search_ingredients(self, prefix=''):
+        """Ингредиенты, название которых начинается с prefix."""
+        prefix = prefix.lower()
+        return [
+            ingredient for name, ingredient in self.get()['ingredients']
+            if name.startswith(prefix)
+        ]
+
+
+class ShortLinkIndex:
+    """Короткая ссылка -> id рецепта, с запросом к БД при промахе.
+
+    При старте загружаются SHORT_LINK_INDEX_SIZE последних рецептов.
+    Удаление рецепта в другом воркере сюда не доходит, поэтому запись
+    старше SHORT_LINK_TTL секунд перепроверяется по БД.
+    """
+
+    def __init__(self):
+        self._links = {}
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'SHORT_LINK_INDEX_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'SHORT_LINK_TTL', 300)
+
+    def preload(self):
+        from recipes.models import Recipe
+
+        rows = Recipe.objects.filter(
+            short_url__isnull=False
+        ).order_by('-id').values_list('short_url', 'id')[:self.max_size]
+        loaded_at = time.monotonic()
+        self._links = {
+            short_url: (recipe_id, loaded_at) for short_url, recipe_id in rows
+        }
+
+    def add(self, short_url, recipe_id):
+        if not short_url:
+            return
+        self._links.pop(short_url, None)
+        if len(self._links) >= self.max_size:
+            self._links.pop(next(iter(self._links)), None)
+        self._links[short_url] = (recipe_id, time.monotonic())
+
+    def remove(self, short_url):
+        self._links.pop(short_url, None)
+
+    def resolve(self, short_url):
+        from recipes.models import Recipe
+
+        entry = self._links.get(short_url)
+        fresh = entry is not None and (
+            time.monotonic() - entry[1] <= self.ttl)
+        cache_result('short_link', fresh)
+        if fresh:
+            return entry[0]
+        recipe_id = Recipe.objects.filter(
+            short_url=short_url).values_list('id', flat=True).first()
+        if recipe_id is None:
+            self.remove(short_url)
+        else:
+            self.add(short_url, recipe_id)
+        return recipe_id
+
+
+catalog = Catalog()
+short_links = ShortLinkIndex()
@@ -0,0 +1,155 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from core.metrics import EXPORT_SIZE, cache_result
+from recipes.models import ExportJob, ShoppingListItem
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def shopping_list_lines(user_id):
+    """Строки списка покупок: (название, единица, количество)."""
+    return list(
+        ShoppingListItem.objects
+        .filter(user_id=user_id)
+        .order_by('ingredient__name')
+        .values_list('ingredient__name', 'ingredient__measurement_unit',
+                     'amount')
+    )
+
+
+def render_txt(lines):
+    """Список покупок в текстовом формате."""
+    buffer = BytesIO()
+    buffer.write('Список покупок:\n\n'.encode('utf-8'))
+    for name, measurement_unit, amount in lines:
+        line = f'- {name}: {amount} {measurement_unit}\n'
+        buffer.write(line.encode('utf-8'))
+    return buffer.getvalue()
+
+
+def render_pdf(lines):
+    """Список покупок в формате PDF."""
+    # reportlab нужен только здесь, не тянем его при старте воркеров
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    try:
+        pdfmetrics.registerFont(TTFont('ExportFont', settings.EXPORT_PDF_FONT))
+        font = 'ExportFont'
+    except Exception:
+        pass
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - 50
+    y = top
+    pdf.setFont(font, 16)
+    pdf.drawString(50, y, 'Список покупок:')
+    pdf.setFont(font, 12)
+    y -= 30
+    for name, measurement_unit, amount in lines:
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = top
+        pdf.drawString(50, y, f'- {name}: {amount} {measurement_unit}')
+        y -= 18
+    pdf.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    ExportJob.TXT: (render_txt, 'txt'),
+    ExportJob.PDF: (render_pdf, 'pdf'),
+}
+
+
+def content_hash(lines, file_format):
+    """Хеш содержимого списка, одинаковые корзины дают один файл."""
+    digest = hashlib.sha256(file_format.encode('utf-8'))
+    for line in lines:
+        digest.update('\x1f'.join(map(str, line)).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def file_path(job):
+    return f'exports/{job.content_hash}.{RENDERERS[job.format][1]}'
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.EXPORT_WORKERS,
+                thread_name_prefix='export',
+            )
+    return _executor
+
+
+def run_job(job_id, lines):
+    """Рендеринг файла в хранилище, выполняется в пуле потоков."""
+    close_old_connections()
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+        path = file_path(job)
+        if not default_storage.exists(path):
+            render, _ = RENDERERS[job.format]
+            content = render(lines)
+            EXPORT_SIZE.labels(job.format).observe(len(content))
+            path = default_storage.save(path, ContentFile(content))
+        job.file.name = path
+        job.status = ExportJob.DONE
+        job.save(update_fields=('file', 'status'))
+    except Exception as error:
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.FAILED, error=str(error)[:255])
+    finally:
+        close_old_connections()
+
+
+def create_job(user, file_format):
+    """Создание задачи экспорта с повторным использованием готовых файлов."""
+    lines = shopping_list_lines(user.id)
+    job = ExportJob(user=user, format=file_format,
+                    content_hash=content_hash(lines, file_format))
+    path = file_path(job)
+    cached = default_storage.exists(path)
+    cache_result('export_file', cached)
+    if cached:
+        job.file.name = path
+        job.status = ExportJob.DONE
+        job.save()
+        return job
+
+    job.save()
+    transaction.on_commit(
+        lambda: get_executor().submit(run_job, job.pk, lines))
+    return job
+
+
+def expire_stale(job):
+    """Задачи, потерянные при перезапуске воркера, помечаем ошибкой."""
+    timeout = timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    if (job.status == ExportJob.PENDING
+            and job.created_at < timezone.now() - timeout):
+        job.status = ExportJob.FAILED
+        job.error = 'Превышено время ожидания.'
+        job.save(update_fields=('status', 'error'))
+    return job
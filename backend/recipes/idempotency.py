@@ -0,0 +1,78 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import IdempotencyKey
+
+
+def fingerprint(request):
+    """Отпечаток запроса: метод, путь и тело."""
+    digest = hashlib.sha256(request.method.encode('utf-8'))
+    digest.update(request.get_full_path().encode('utf-8'))
+    digest.update(b'\x1e')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def expired_before(ttl=None):
+    if ttl is None:
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+    return timezone.now() - timedelta(seconds=ttl)
+
+
+def is_expired(record):
+    """Ответ хранится IDEMPOTENCY_KEY_TTL, незавершённый запрос — меньше.
+
+    Незавершённая запись остаётся после падения процесса между claim()
+    и release(), и ключ не должен быть занят до конца суток.
+    """
+    if record.status_code is None:
+        return record.created_at < expired_before(
+            settings.IDEMPOTENCY_CLAIM_TTL)
+    return record.created_at < expired_before()
+
+
+def claim(user, key, request_fingerprint):
+    """Занимает ключ: (запись, True) для нового или (запись, False)."""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=request_fingerprint
+                ), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(
+                user=user, key=key).first()
+        if record is None:
+            continue
+        if not is_expired(record):
+            return record, False
+        # Просроченный ключ освобождаем и пробуем занять заново
+        IdempotencyKey.objects.filter(
+            pk=record.pk, created_at=record.created_at,
+            status_code=record.status_code,
+        ).delete()
+    return record, False
+
+
+def store(record, response):
+    record.status_code = response.status_code
+    record.response = response.data
+    record.save(update_fields=('status_code', 'response'))
+
+
+def release(record):
+    """Запрос не выполнен, повтор с тем же ключом выполнит его заново."""
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def clear_expired():
+    return IdempotencyKey.objects.filter(
+        Q(created_at__lt=expired_before())
+        | Q(status_code__isnull=True,
+            created_at__lt=expired_before(settings.IDEMPOTENCY_CLAIM_TTL))
+    ).delete()[0]
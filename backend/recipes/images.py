@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from recipes.models import Recipe
+from users.models import User
+
+# Поля, которые ссылаются на общие файлы картинок
+IMAGE_FIELDS = (
+    (Recipe, 'image'),
+    (User, 'avatar'),
+)
+
+
+def reference_count(name):
+    """Сколько объектов ссылается на файл."""
+    return sum(
+        model.objects.filter(**{field: name}).count()
+        for model, field in IMAGE_FIELDS
+    )
+
+
+def referenced_names(names):
+    """Имена из списка, на которые есть ссылки."""
+    referenced = set()
+    for model, field in IMAGE_FIELDS:
+        referenced.update(model.objects.filter(
+            **{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def recently_saved(name, grace=None):
+    """Файл недавно записан и может ждать сохранения своего объекта."""
+    if grace is None:
+        grace = settings.IMAGE_GC_GRACE
+    modified = default_storage.get_modified_time(name)
+    return modified > timezone.now() - timedelta(seconds=grace)
+
+
+def release(name):
+    """Удаляет файл, если на него больше никто не ссылается."""
+    if (not name or not default_storage.exists(name)
+            or recently_saved(name) or reference_count(name)):
+        return False
+    default_storage.delete(name)
+    return True
+
+
+def orphans(grace=None, batch_size=1000):
+    """Файлы картинок без ссылок, старше периода ожидания."""
+    directories = getattr(default_storage, 'hashed_dirs', ())
+    for directory in directories:
+        _, files = default_storage.listdir(directory)
+        names = [
+            directory + filename for filename in files
+            if not recently_saved(directory + filename, grace)
+        ]
+        for offset in range(0, len(names), batch_size):
+            batch = names[offset:offset + batch_size]
+            referenced = referenced_names(batch)
+            yield from (name for name in batch if name not in referenced)
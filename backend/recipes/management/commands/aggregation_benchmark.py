@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.aggregation import Totals
+
+
+def naive(ingredient_ids, units, amounts):
+    """Суммирование в словаре по паре (ингредиент, единица)."""
+    totals = defaultdict(int)
+    for key, amount in zip(zip(ingredient_ids, units), amounts):
+        totals[key] += amount
+    return totals
+
+
+class Command(BaseCommand):
+    help = 'Замер суммирования строк списка покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000)
+        parser.add_argument('--ingredients', type=int, default=2200)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--per-user', type=int, default=40,
+                            help='Разных ингредиентов у пользователя')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count = options['lines']
+        pantries = [
+            rng.sample(range(1, options['ingredients'] + 1),
+                       options['per_user'])
+            for _ in range(options['users'])
+        ]
+        keys = [rng.randrange(options['users']) for _ in range(count)]
+        ingredient_ids = [rng.choice(pantries[key]) for key in keys]
+        units = ['г'] * count
+        amounts = [rng.randrange(1, 1000) for _ in range(count)]
+
+        cases = (
+            ('dict (ингредиент, единица)',
+             lambda: naive(ingredient_ids, units, amounts)),
+            ('Totals', lambda: Totals().add(ingredient_ids, units, amounts)),
+            ('Totals x2',
+             lambda: Totals().add(ingredient_ids, units, amounts, 2)),
+        )
+        self.stdout.write(f'{count} строк, медиана {options["runs"]} замеров:')
+        for name, func in cases:
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'  {name}: {statistics.median(timings):.0f} мс')
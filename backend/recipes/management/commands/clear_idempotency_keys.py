@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Удаление просроченных ключей идемпотентности'
+
+    def handle(self, *args, **options):
+        deleted = idempotency.clear_expired()
+        self.stdout.write(self.style.SUCCESS(f'Удалено ключей: {deleted}.'))
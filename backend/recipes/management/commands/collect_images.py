@@ -0,0 +1,25 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes import images
+
+
+class Command(BaseCommand):
+    help = 'Удаление файлов картинок, на которые нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=None,
+                            help='Не трогать файлы моложе, секунд')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать найденные файлы')
+
+    def handle(self, *args, **options):
+        count = 0
+        for name in images.orphans(grace=options['grace']):
+            count += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {count}.'))
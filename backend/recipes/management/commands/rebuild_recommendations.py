@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по избранному и корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты, а не только изменившиеся')
+
+    def handle(self, *args, **options):
+        build = recommendations.rebuild(full=options['full'])
+        kind = 'Полный пересчёт' if build.full else 'Пересчёт изменившихся'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind}: {build.recipes} рецептов за {build.seconds:.1f} с.'))
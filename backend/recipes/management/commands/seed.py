@@ -0,0 +1,285 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from recipes import shopping_list
+from recipes.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+from users.signals import recount_counters
+
+SEED_IMAGE = 'recipes/seed.png'
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'bakery'),
+    ('Суп', 'soup'),
+)
+ADJECTIVES = ('Домашний', 'Быстрый', 'Летний', 'Пряный', 'Нежный',
+              'Острый', 'Сытный', 'Лёгкий', 'Праздничный', 'Бабушкин')
+DISHES = ('салат', 'суп', 'пирог', 'омлет', 'плов', 'гуляш', 'рагу',
+          'пудинг', 'соус', 'кекс', 'борщ', 'гратен')
+WORDS = ('нарезать', 'смешать', 'обжарить', 'добавить', 'посолить',
+         'варить', 'запекать', 'минут', 'до', 'готовности', 'на',
+         'среднем', 'огне', 'подавать', 'горячим', 'с', 'зеленью')
+
+
+class ZipfSampler:
+    """Выбор элементов с частотой, обратной рангу в степени s."""
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def choices(self, k):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=k)
+
+    def unique(self, k, exclude=None):
+        k = min(k, len(self.items) - (exclude is not None))
+        result = set()
+        attempts = 0
+        while len(result) < k and attempts < 20:
+            result.update(self.choices(k - len(result)))
+            result.discard(exclude)
+            attempts += 1
+        return result
+
+
+class Command(BaseCommand):
+    help = 'Генерация тестовых данных большого объёма'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--subscriptions', type=int, default=5,
+                            help='Подписок на пользователя в среднем')
+        parser.add_argument('--favorites', type=int, default=10,
+                            help='Избранных рецептов на пользователя')
+        parser.add_argument('--cart', type=int, default=3,
+                            help='Рецептов в корзине на пользователя')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения популярности')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql'
+        self.now = timezone.now()
+
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов, сначала выполните import_csv.')
+        tag_ids = self.ensure_tags()
+        self.image = self.ensure_image()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, ingredient_ids, tag_ids,
+                options['zipf'])
+            self.create_user_links(
+                user_ids, recipe_ids, options)
+            self.reset_sequences()
+            self.stdout.write('Пересчёт счётчиков и списков покупок...')
+            recount_counters(User.objects.filter(id__in=user_ids))
+            shopping_list.rebuild(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}.'))
+
+    def ensure_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def ensure_image(self):
+        """Картинка-заглушка, общая для всех рецептов.
+
+        Хранилище не записывает повторно файл с тем же содержимым.
+        """
+        return default_storage.save(SEED_IMAGE,
+                                    ContentFile(self.placeholder()))
+
+    def placeholder(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), (230, 180, 80)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def next_id(self, model):
+        return (model.objects.aggregate(
+            models.Max('id'))['id__max'] or 0) + 1
+
+    def create_users(self, count):
+        start = self.next_id(User)
+        password = make_password('seed-password')
+        user_ids = list(range(start, start + count))
+        fields = ('id', 'username', 'email', 'first_name', 'last_name',
+                  'password', 'is_superuser', 'is_staff', 'is_active',
+                  'date_joined', 'updated_at', 'followers_count',
+                  'following_count', 'recipes_count')
+        self.write(User, fields, (
+            (user_id, f'seed_{user_id}', f'seed_{user_id}@example.com',
+             f'Имя{user_id}', f'Фамилия{user_id}', password,
+             False, False, True, self.now, self.now, 0, 0, 0)
+            for user_id in user_ids
+        ))
+        return user_ids
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids,
+                       exponent):
+        rng = self.rng
+        authors = ZipfSampler(rng, user_ids, exponent)
+        ingredients = ZipfSampler(rng, ingredient_ids, exponent)
+        tags = ZipfSampler(rng, tag_ids, exponent)
+        start = self.next_id(Recipe)
+        recipe_ids = list(range(start, start + count))
+        through = Recipe.tags.through
+
+        for offset in range(0, count, self.batch_size):
+            batch = recipe_ids[offset:offset + self.batch_size]
+            recipes, recipe_ingredients, recipe_tags = [], [], []
+            author_ids = authors.choices(len(batch))
+            for recipe_id, author_id in zip(batch, author_ids):
+                pub_date = self.now - timedelta(
+                    seconds=rng.randint(0, 365 * 24 * 3600))
+                recipes.append((
+                    recipe_id, author_id,
+                    f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                    ' '.join(rng.choices(WORDS, k=rng.randint(10, 40))),
+                    rng.randint(5, 180), self.image, pub_date, pub_date,
+                ))
+                for ingredient_id in ingredients.unique(
+                        int(rng.triangular(2, 15, 6))):
+                    recipe_ingredients.append(
+                        (recipe_id, ingredient_id, rng.randint(1, 500)))
+                for tag_id in tags.unique(rng.randint(1, 3)):
+                    recipe_tags.append((recipe_id, tag_id))
+
+            self.write(Recipe, ('id', 'author_id', 'name', 'text',
+                                'cooking_time', 'image', 'pub_date',
+                                'updated_at'), recipes)
+            self.write(IngredientForRecipe,
+                       ('recipe_id', 'ingredient_id', 'amount'),
+                       recipe_ingredients)
+            self.write(through, ('recipe_id', 'tag_id'), recipe_tags)
+            self.stdout.write(f'Рецептов: {offset + len(batch)}/{count}')
+        return recipe_ids
+
+    def create_user_links(self, user_ids, recipe_ids, options):
+        rng = self.rng
+        authors = ZipfSampler(rng, user_ids, options['zipf'])
+        recipes = ZipfSampler(rng, recipe_ids, options['zipf'])
+        links = (
+            (Subscription, ('user_id', 'author_id'),
+             options['subscriptions'], authors),
+            (Favorite, ('user_id', 'recipe_id'),
+             options['favorites'], recipes),
+            (ShoppingCart, ('user_id', 'recipe_id'),
+             options['cart'], recipes),
+        )
+        for model, fields, average, sampler in links:
+            if not average or not sampler.items:
+                continue
+
+            def rows():
+                for user_id in user_ids:
+                    k = rng.randint(0, 2 * average)
+                    exclude = user_id if model is Subscription else None
+                    for target_id in sampler.unique(k, exclude=exclude):
+                        yield user_id, target_id
+
+            self.write(model, fields, rows())
+
+    def write(self, model, fields, rows):
+        """Пакетная вставка: COPY на PostgreSQL, bulk_create в остальных."""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(model, fields, batch)
+                batch = []
+        if batch:
+            self.flush(model, fields, batch)
+
+    def flush(self, model, fields, batch):
+        if not self.use_copy:
+            with explicit_dates(model):
+                model.objects.bulk_create(
+                    model(**dict(zip(fields, row))) for row in batch)
+            return
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(map(copy_value, row)))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+@contextmanager
+def explicit_dates(model):
+    """Отключает auto_now и auto_now_add, чтобы сохранить сгенерированные даты.
+
+    bulk_create вызывает pre_save, который иначе заменит их текущим временем.
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n'))
@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+
+from recipes.aggregation import Totals
+from recipes.models import MealPlanDay, MealPlanEntry
+from recipes.shopping_list import recipe_amounts
+
+
+def compute_days(user_id, dates):
+    """Подытоги по дням заново из плана: {дата: Totals}."""
+    entries = list(MealPlanEntry.objects.filter(
+        user_id=user_id, date__in=dates
+    ).values_list('date', 'recipe_id', 'servings'))
+    amounts = recipe_amounts({recipe_id for _, recipe_id, _ in entries})
+    totals = {date: Totals() for date in dates}
+    for date, recipe_id, servings in entries:
+        ingredients = amounts.get(recipe_id, {})
+        totals[date].add(
+            list(ingredients), None, list(ingredients.values()), servings)
+    return totals
+
+
+def day_totals(user_id, dates):
+    """Подытоги по дням: сохранённые берутся как есть, остальные считаются.
+
+    Для недостающих дней сначала создаётся пустая запись, а итог пишется
+    в неё после расчёта. Если правка плана закоммичена во время расчёта,
+    её invalidate() удалит запись, и устаревший итог не сохранится.
+    """
+    days = {
+        day.date: day.totals
+        for day in MealPlanDay.objects.filter(user_id=user_id, date__in=dates)
+    }
+    totals = {
+        date: Totals().add(
+            [int(key) for key in day], None, list(day.values()))
+        for date, day in days.items() if day is not None
+    }
+    missing = [date for date in dates if date not in totals]
+    if missing:
+        MealPlanDay.objects.bulk_create(
+            (MealPlanDay(user_id=user_id, date=date)
+             for date in missing if date not in days),
+            ignore_conflicts=True,
+        )
+        computed = compute_days(user_id, missing)
+        for date, day in computed.items():
+            MealPlanDay.objects.filter(
+                user_id=user_id, date=date, totals__isnull=True
+            ).update(totals=day.as_dict())
+        totals.update(computed)
+    return totals
+
+
+def period_totals(user_id, start, days=7):
+    """Суммы ингредиентов плана за days дней начиная со start."""
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    result = Totals()
+    for day in day_totals(user_id, dates).values():
+        result.merge(day)
+    return result
+
+
+def invalidate(user_id, dates):
+    """Сбрасывает подытоги изменённых дней."""
+    MealPlanDay.objects.filter(user_id=user_id, date__in=dates).delete()
+
+
+def invalidate_recipe(recipe_id):
+    """Сбрасывает подытоги всех дней, в которых есть рецепт."""
+    invalidate_recipes([recipe_id])
+
+
+def invalidate_recipes(recipe_ids):
+    """Сбрасывает подытоги всех дней, в которых есть эти рецепты."""
+    MealPlanDay.objects.filter(Exists(MealPlanEntry.objects.filter(
+        user_id=OuterRef('user_id'), date=OuterRef('date'),
+        recipe_id__in=recipe_ids,
+    ))).delete()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, help_text='Выберите изображение', upload_to='recipes/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recommendations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mealplanday',
+            name='totals',
+            field=models.JSONField(blank=True, null=True, verbose_name='Ингредиенты'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import connections, models, router
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from core.constants import MAX_GEN
@@ -69,6 +70,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        db_index=True,
         verbose_name='Изображение',
         help_text='Выберите изображение',
     )
@@ -89,6 +91,7 @@ class Recipe(models.Model):
                     MaxValueValidator(500)],
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     short_url = models.CharField(
         unique=True, null=True, blank=True, max_length=MAX_GEN)
 
@@ -166,6 +169,88 @@ class AbstractUserRecipe(models.Model):
     def __str__(self):
         return f'Рецепт: {self.recipe.name}, Пользователь: {self.user}'
 
+    @classmethod
+    def add(cls, user_id, recipe_id):
+        """Идемпотентное добавление без предварительной проверки.
+
+        Возвращает True, если запись создана, и False, если уже была.
+        """
+        connection = connections[router.db_for_write(cls)]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            return cls.objects.get_or_create(
+                user_id=user_id, recipe_id=recipe_id)[1]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {connection.ops.quote_name(cls._meta.db_table)}'
+                ' (user_id, recipe_id) VALUES (%s, %s)'
+                ' ON CONFLICT DO NOTHING',
+                [user_id, recipe_id]
+            )
+            return cursor.rowcount > 0
+
+    @classmethod
+    def _returning(cls):
+        """Соединение, если БД поддерживает INSERT/DELETE ... RETURNING."""
+        connection = connections[router.db_for_write(cls)]
+        if connection.vendor == 'postgresql' or (
+                connection.vendor == 'sqlite'
+                and connection.Database.sqlite_version_info >= (3, 35)):
+            return connection
+        return None
+
+    @classmethod
+    def add_many(cls, user_id, recipe_ids):
+        """Добавление рецептов, возвращает id реально вставленных.
+
+        Уже существующие записи пропускаются базой, поэтому при
+        параллельных запросах каждый рецепт считается добавленным
+        только одним из них.
+        """
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return set()
+        connection = cls._returning()
+        if connection is None:
+            return {
+                recipe_id for recipe_id in recipe_ids
+                if cls.objects.get_or_create(
+                    user_id=user_id, recipe_id=recipe_id)[1]
+            }
+        table = connection.ops.quote_name(cls._meta.db_table)
+        rows = ', '.join(['(%s, %s)'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) VALUES {rows}'
+                ' ON CONFLICT DO NOTHING RETURNING recipe_id',
+                [value for recipe_id in recipe_ids
+                 for value in (user_id, recipe_id)]
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+    @classmethod
+    def remove_many(cls, user_id, recipe_ids):
+        """Удаление рецептов, возвращает id реально удалённых."""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return set()
+        connection = cls._returning()
+        if connection is None:
+            rows = cls.objects.select_for_update().filter(
+                user_id=user_id, recipe_id__in=recipe_ids)
+            removed = set(rows.values_list('recipe_id', flat=True))
+            cls.objects.filter(
+                user_id=user_id, recipe_id__in=removed).delete()
+            return removed
+        table = connection.ops.quote_name(cls._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s'
+                f' AND recipe_id IN ({placeholders}) RETURNING recipe_id',
+                [user_id, *recipe_ids]
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
 
 class Favorite(AbstractUserRecipe):
     """Модель для сохранения избранных рецептов."""
@@ -200,3 +285,222 @@ class ShoppingCart(AbstractUserRecipe):
 
     def __str__(self):
         return f'Рецепт в списке у {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='+',
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} для {self.user}: {self.amount}'
+
+
+class ExportJob(models.Model):
+    """Задача фоновой выгрузки списка покупок в файл."""
+
+    TXT = 'txt'
+    PDF = 'pdf'
+    FORMATS = (
+        (TXT, 'Текст'),
+        (PDF, 'PDF'),
+    )
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='export_jobs',
+    )
+    format = models.CharField(
+        'Формат', max_length=8, choices=FORMATS, default=TXT)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING)
+    content_hash = models.CharField('Хеш содержимого', max_length=64)
+    file = models.FileField('Файл', upload_to='exports/', blank=True)
+    error = models.CharField('Ошибка', max_length=255, blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'Выгрузка {self.pk} для {self.user}: {self.status}'
+
+
+class IdempotencyKey(models.Model):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='idempotency_keys',
+    )
+    key = models.CharField('Ключ', max_length=255)
+    fingerprint = models.CharField('Отпечаток запроса', max_length=64)
+    status_code = models.PositiveSmallIntegerField(
+        'Код ответа', null=True, blank=True)
+    response = models.JSONField(
+        'Ответ', null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'key'),
+                name='unique_user_idempotency_key'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.key}'
+
+
+class MealPlanEntry(models.Model):
+    """Рецепт в плане питания на конкретный день."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='meal_plan',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='meal_plan_entries',
+    )
+    date = models.DateField('Дата')
+    servings = models.PositiveSmallIntegerField(
+        'Порций',
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(100)]
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в плане питания'
+        verbose_name_plural = 'План питания'
+        ordering = ('date', 'id')
+        indexes = (
+            models.Index(fields=('user', 'date'),
+                         name='meal_plan_user_date'),
+        )
+
+    def __str__(self):
+        return f'{self.date}: {self.recipe} x{self.servings}'
+
+
+class MealPlanDay(models.Model):
+    """Подытог ингредиентов за день плана питания.
+
+    Запись удаляется при любом изменении дня или рецептов в нём
+    и пересчитывается при следующем запросе списка покупок. Пустые
+    totals - день занят расчётом, см. meal_plan.day_totals().
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='+',
+    )
+    date = models.DateField('Дата')
+    totals = models.JSONField('Ингредиенты', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Подытог дня плана питания'
+        verbose_name_plural = 'Подытоги дней плана питания'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'date'),
+                name='unique_meal_plan_day'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.date}'
+
+
+class RecipeSimilarity(models.Model):
+    """Похожий рецепт: часто вместе в избранном и корзинах."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similarities',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='+',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='similarity_recipe_score'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class RecommendationBuild(models.Model):
+    """Пересчёт похожих рецептов и обработанные им записи."""
+
+    full = models.BooleanField('Полный пересчёт', default=False)
+    favorite_id = models.BigIntegerField('Последний id избранного')
+    cart_id = models.BigIntegerField('Последний id корзины')
+    recipes = models.PositiveIntegerField('Пересчитано рецептов')
+    seconds = models.FloatField('Длительность, с')
+    created_at = models.DateTimeField('Выполнен', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Пересчёт похожих рецептов'
+        verbose_name_plural = 'Пересчёты похожих рецептов'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.created_at}: {self.recipes} рецептов'
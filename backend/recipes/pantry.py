@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core.metrics import cache_result
+
+logger = logging.getLogger('foodgram.pantry')
+
+
+class PantryIndex:
+    """Инвертированный индекс «ингредиент -> рецепты» в памяти процесса.
+
+    Списки рецептов хранятся неизменяемыми frozenset и при записи
+    заменяются целиком, поэтому чтение обходится без блокировок.
+    Устаревший индекс перестраивается в фоновом потоке, а запросы
+    до его готовности обслуживает прежний.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._postings = {}
+        self._recipes = {}
+        self._built_at = None
+        # Рецепты, изменённые во время фонового построения
+        self._dirty = None
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'PANTRY_INDEX_TTL', 300)
+
+    def _is_stale(self):
+        if self._built_at is None:
+            return True
+        return (self.ttl is not None
+                and time.monotonic() - self._built_at > self.ttl)
+
+    def build(self):
+        """Полное построение индекса по IngredientForRecipe."""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        from recipes.models import IngredientForRecipe
+
+        with self._lock:
+            self._dirty = set()
+        recipes = {}
+        rows = IngredientForRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id').iterator()
+        for recipe_id, ingredient_id in rows:
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+
+        postings = {}
+        for recipe_id, ingredient_ids in recipes.items():
+            for ingredient_id in ingredient_ids:
+                postings.setdefault(ingredient_id, set()).add(recipe_id)
+
+        with self._lock:
+            self._recipes = {
+                key: frozenset(value) for key, value in recipes.items()}
+            self._postings = {
+                key: frozenset(value) for key, value in postings.items()}
+            self._built_at = time.monotonic()
+            dirty, self._dirty = self._dirty, None
+        # Снимок мог не увидеть правки, закоммиченные во время построения
+        for recipe_id in dirty:
+            self.refresh_recipe(recipe_id)
+
+    def _build_in_background(self):
+        close_old_connections()
+        try:
+            self._build()
+        except Exception:
+            logger.exception('Pantry index rebuild failed')
+        finally:
+            self._build_lock.release()
+            close_old_connections()
+
+    def ensure_built(self):
+        stale = self._is_stale()
+        cache_result('pantry_index', not stale)
+        if not stale:
+            return
+        if self._built_at is None:
+            self.build()
+        elif self._build_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._build_in_background,
+                name='pantry-index', daemon=True,
+            ).start()
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Инкрементальное обновление индекса для одного рецепта."""
+        if self._built_at is None:
+            return
+        ingredient_ids = frozenset(ingredient_ids)
+        with self._lock:
+            if self._dirty is not None:
+                self._dirty.add(recipe_id)
+            old_ids = self._recipes.get(recipe_id, frozenset())
+            for ingredient_id in old_ids - ingredient_ids:
+                posting = self._postings.get(
+                    ingredient_id, frozenset()) - {recipe_id}
+                if posting:
+                    self._postings[ingredient_id] = posting
+                else:
+                    self._postings.pop(ingredient_id, None)
+            for ingredient_id in ingredient_ids - old_ids:
+                self._postings[ingredient_id] = (
+                    self._postings.get(ingredient_id, frozenset())
+                    | {recipe_id})
+            if ingredient_ids:
+                self._recipes[recipe_id] = ingredient_ids
+            else:
+                self._recipes.pop(recipe_id, None)
+
+    def refresh_recipe(self, recipe_id):
+        """Перечитывает ингредиенты рецепта из базы и обновляет индекс."""
+        from recipes.models import IngredientForRecipe
+
+        if self._built_at is None:
+            return
+        self.set_recipe(recipe_id, IngredientForRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+
+    def remove_recipe(self, recipe_id):
+        self.set_recipe(recipe_id, ())
+
+    def rank(self, ingredient_ids, limit=None):
+        """Рецепты, отсортированные по покрытию набора ингредиентов.
+
+        Возвращает список кортежей (recipe_id, совпало, всего).
+        """
+        self.ensure_built()
+        postings = self._postings
+        recipes = self._recipes
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+
+        ranked = []
+        for recipe_id, count in matched.items():
+            total = len(recipes.get(recipe_id, ())) or count
+            ranked.append((recipe_id, count, total))
+        ranked.sort(key=lambda item: (
+            -item[1] / item[2], item[2] - item[1], -item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
+
+
+pantry_index = PantryIndex()
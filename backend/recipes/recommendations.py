@@ -0,0 +1,280 @@
+"""Похожие рецепты по совместному появлению в избранном и корзинах.
+
+Сходство двух рецептов — косинус: число пользователей, у которых есть
+оба, делённое на корень из произведения их популярности. Избранное
+и корзина считаются отдельными сигналами. Для каждого рецепта хранятся
+RECOMMENDATIONS_TOP_K лучших в RecipeSimilarity.
+"""
+import heapq
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q
+
+from recipes.models import (Favorite, RecipeSimilarity, RecommendationBuild,
+                            ShoppingCart)
+
+SIGNALS = (Favorite, ShoppingCart)
+# Рецептов в одном запросе к БД и в одной транзакции записи
+BATCH = 1000
+
+
+def load_pairs(condition=None):
+    """Пары (пользователь, рецепт) каждого сигнала в порядке добавления.
+
+    Для каждой модели из SIGNALS - два параллельных array, упорядоченных
+    по pk: у избранного и корзины нет общего времени добавления.
+    """
+    pairs = []
+    for model in SIGNALS:
+        users, recipes = array('i'), array('i')
+        rows = model.objects.order_by('pk')
+        if condition is not None:
+            rows = rows.filter(condition)
+        rows = rows.values_list('user_id', 'recipe_id')
+        for user_id, recipe_id in rows.iterator(chunk_size=10000):
+            users.append(user_id)
+            recipes.append(recipe_id)
+        pairs.append((users, recipes))
+    return pairs
+
+
+def group(keys, values):
+    """Группировка values по keys в сжатые строки.
+
+    Значения группы key лежат в grouped[starts[key]:starts[key + 1]]
+    в исходном порядке.
+    """
+    size = max(keys, default=-1) + 2
+    starts = array('q', bytes(8 * size))
+    for key, count in Counter(keys).items():
+        starts[key + 1] = count
+    for index in range(1, size):
+        starts[index] += starts[index - 1]
+
+    positions = array('q', starts)
+    grouped = array('i', bytes(4 * len(values)))
+    for key, value in zip(keys, values):
+        grouped[positions[key]] = value
+        positions[key] += 1
+    return starts, grouped
+
+
+def batches(items):
+    items = list(items)
+    for offset in range(0, len(items), BATCH):
+        yield items[offset:offset + BATCH]
+
+
+class CoOccurrence:
+    """Корзины пользователей и обратные индексы «рецепт -> пользователи».
+
+    Обратный индекс свой у каждого сигнала, пользователи в нём идут
+    в порядке добавления записей.
+    """
+
+    def __init__(self, pairs):
+        users = array('i', chain.from_iterable(users for users, _ in pairs))
+        recipes = array('i', chain.from_iterable(
+            recipes for _, recipes in pairs))
+        self.basket_starts, self.baskets = group(users, recipes)
+        del users, recipes
+        self.fan_index = [group(recipes, users) for users, recipes in pairs]
+        size = max(len(starts) for starts, _ in self.fan_index) - 1
+        self.counts = array('q', bytes(8 * size))
+        for starts, _ in self.fan_index:
+            for recipe_id in range(len(starts) - 1):
+                self.counts[recipe_id] += (
+                    starts[recipe_id + 1] - starts[recipe_id])
+
+    def recipe_ids(self):
+        return [recipe_id for recipe_id, count in enumerate(self.counts)
+                if count]
+
+    def popularity(self, recipe_id):
+        if recipe_id >= len(self.counts):
+            return 0
+        return self.counts[recipe_id]
+
+    def basket(self, user_id):
+        if user_id + 1 >= len(self.basket_starts):
+            return ()
+        return self.baskets[
+            self.basket_starts[user_id]:self.basket_starts[user_id + 1]]
+
+    def fans(self, recipe_id):
+        """Пользователи рецепта, по каждому сигналу MAX_FANS последних.
+
+        Популярному рецепту этой выборки достаточно.
+        """
+        max_fans = settings.RECOMMENDATIONS_MAX_FANS
+        for starts, fans in self.fan_index:
+            if recipe_id + 1 >= len(starts):
+                continue
+            end = starts[recipe_id + 1]
+            yield from fans[max(starts[recipe_id], end - max_fans):end]
+
+    def common(self, recipe_id):
+        """Сколько раз каждый рецепт встречается вместе с recipe_id."""
+        max_basket = settings.RECOMMENDATIONS_MAX_BASKET
+        baskets = (self.basket(user_id) for user_id in self.fans(recipe_id))
+        common = Counter(chain.from_iterable(
+            basket for basket in baskets if len(basket) <= max_basket))
+        del common[recipe_id]
+        return common
+
+
+def score(count, popularity, other_popularity):
+    if not popularity or not other_popularity:
+        return 0
+    return count / math.sqrt(popularity * other_popularity)
+
+
+def top(scores):
+    return heapq.nlargest(
+        settings.RECOMMENDATIONS_TOP_K, scores, key=lambda item: item[1])
+
+
+def best(recipe_id, common, popularity):
+    """Лучшие похожие рецепты: [(id, сходство)]."""
+    min_common = settings.RECOMMENDATIONS_MIN_COMMON
+    own = popularity(recipe_id)
+    return top(
+        (other_id, score(count, own, popularity(other_id)))
+        for other_id, count in common.items() if count >= min_common
+    )
+
+
+def global_popularity(recipe_ids):
+    """Популярность рецептов по всей БД, а не по загруженной части."""
+    counts = Counter()
+    for batch in batches(recipe_ids):
+        for model in SIGNALS:
+            counts.update(dict(
+                model.objects.filter(recipe_id__in=batch).order_by()
+                .values('recipe_id').annotate(count=Count('id'))
+                .values_list('recipe_id', 'count')
+            ))
+    return counts
+
+
+def save(similar):
+    """Заменяет похожие рецепты для пересчитанных рецептов."""
+    for batch in batches(similar):
+        with transaction.atomic():
+            RecipeSimilarity.objects.filter(recipe_id__in=batch).delete()
+            RecipeSimilarity.objects.bulk_create(
+                RecipeSimilarity(recipe_id=recipe_id, similar_id=other_id,
+                                 score=value)
+                for recipe_id in batch
+                for other_id, value in similar[recipe_id]
+            )
+
+
+def rebuild_all():
+    """Пересчёт всех рецептов по всем записям."""
+    index = CoOccurrence(load_pairs())
+    recipe_ids = index.recipe_ids()
+    for batch in batches(recipe_ids):
+        save({
+            recipe_id: best(recipe_id, index.common(recipe_id),
+                            index.popularity)
+            for recipe_id in batch
+        })
+    # Рецепты, которых больше нет ни в избранном, ни в корзинах
+    RecipeSimilarity.objects.exclude(
+        Exists(Favorite.objects.filter(recipe_id=OuterRef('recipe_id')))
+    ).exclude(
+        Exists(ShoppingCart.objects.filter(recipe_id=OuterRef('recipe_id')))
+    ).delete()
+    return len(recipe_ids)
+
+
+def rebuild_changed(last_build):
+    """Пересчёт по записям, добавленным после last_build.
+
+    Рецепты из новых записей пересчитываются целиком. В списки остальных
+    рецептов тех же пользователей добавляются только пары с ними.
+    Удаления из избранного и корзин учитывает только полный пересчёт.
+    """
+    new_pairs = list(chain(
+        Favorite.objects.filter(pk__gt=last_build.favorite_id)
+        .values_list('user_id', 'recipe_id'),
+        ShoppingCart.objects.filter(pk__gt=last_build.cart_id)
+        .values_list('user_id', 'recipe_id'),
+    ))
+    if not new_pairs:
+        return 0
+    changed = {recipe_id for _, recipe_id in new_pairs}
+
+    # Нужны только корзины пользователей, у которых есть эти рецепты
+    fans = Q()
+    for model in SIGNALS:
+        fans |= Q(user_id__in=model.objects.filter(
+            recipe_id__in=changed).values('user_id'))
+    index = CoOccurrence(load_pairs(fans))
+
+    min_common = settings.RECOMMENDATIONS_MIN_COMMON
+    commons = {recipe_id: index.common(recipe_id) for recipe_id in changed}
+    counts = global_popularity(changed | {
+        other_id
+        for common in commons.values()
+        for other_id, count in common.items() if count >= min_common
+    })
+    similar = {
+        recipe_id: best(recipe_id, common, counts.__getitem__)
+        for recipe_id, common in commons.items()
+    }
+
+    # Совместная встречаемость симметрична, пары для соседей уже посчитаны
+    neighbours = set(chain.from_iterable(
+        index.basket(user_id) for user_id, _ in new_pairs)) - changed
+    additions = defaultdict(dict)
+    for recipe_id, common in commons.items():
+        for other_id in neighbours.intersection(common):
+            if common[other_id] >= min_common:
+                additions[other_id][recipe_id] = score(
+                    common[other_id], counts[recipe_id], counts[other_id])
+    current = defaultdict(dict)
+    for batch in batches(additions):
+        rows = RecipeSimilarity.objects.filter(
+            recipe_id__in=batch
+        ).values_list('recipe_id', 'similar_id', 'score')
+        for recipe_id, other_id, value in rows:
+            current[recipe_id][other_id] = value
+    for recipe_id, added in additions.items():
+        similar[recipe_id] = top({**current[recipe_id], **added}.items())
+
+    save(similar)
+    return len(similar)
+
+
+def rebuild(full=False):
+    """Пересчёт похожих рецептов, по умолчанию только изменившихся."""
+    started = time.perf_counter()
+    last_build = RecommendationBuild.objects.first()
+    full = full or last_build is None
+    # Записи, добавленные во время пересчёта, попадут в следующий
+    watermarks = {
+        'favorite_id': Favorite.objects.aggregate(value=Max('pk'))['value'],
+        'cart_id': ShoppingCart.objects.aggregate(value=Max('pk'))['value'],
+    }
+    recipes = rebuild_all() if full else rebuild_changed(last_build)
+    return RecommendationBuild.objects.create(
+        full=full,
+        favorite_id=watermarks['favorite_id'] or 0,
+        cart_id=watermarks['cart_id'] or 0,
+        recipes=recipes,
+        seconds=time.perf_counter() - started,
+    )
+
+
+def similar_recipe_ids(recipe_id, limit):
+    return list(RecipeSimilarity.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('-score').values_list('similar_id', flat=True)[:limit])
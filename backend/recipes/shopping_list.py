@@ -0,0 +1,177 @@
+from collections import defaultdict
+
+from django.db import (IntegrityError, connections, models, router,
+                       transaction)
+
+from recipes.aggregation import Totals, columns
+from recipes.models import IngredientForRecipe, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(recipe_ids):
+    """Состав рецептов: {recipe_id: {ingredient_id: amount}}."""
+    amounts = defaultdict(dict)
+    rows = IngredientForRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id', 'amount')
+    for recipe_id, ingredient_id, amount in rows:
+        amounts[recipe_id][ingredient_id] = amount
+    return amounts
+
+
+# Строк в одном INSERT ... ON CONFLICT
+UPSERT_BATCH = 500
+
+
+def _upsert_connection():
+    """Соединение, если БД умеет INSERT ... ON CONFLICT DO UPDATE."""
+    connection = connections[router.db_for_write(ShoppingListItem)]
+    if connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 24)):
+        return connection
+    return None
+
+
+def _increment(rows):
+    """Прибавляет положительные количества, создавая недостающие строки.
+
+    Вставка и прибавление выполняются одним запросом, поэтому два
+    параллельных добавления одного нового ингредиента не падают на
+    unique_shopping_list_item.
+    """
+    connection = _upsert_connection()
+    if connection is None:
+        for (user_id, ingredient_id), diff in rows:
+            items = ShoppingListItem.objects.filter(
+                user_id=user_id, ingredient_id=ingredient_id)
+            if items.update(amount=models.F('amount') + diff):
+                continue
+            try:
+                with transaction.atomic():
+                    ShoppingListItem.objects.create(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=diff)
+            except IntegrityError:
+                items.update(amount=models.F('amount') + diff)
+        return
+    table = connection.ops.quote_name(ShoppingListItem._meta.db_table)
+    for offset in range(0, len(rows), UPSERT_BATCH):
+        batch = rows[offset:offset + UPSERT_BATCH]
+        values = ', '.join(['(%s, %s, %s)'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount)'
+                f' VALUES {values}'
+                ' ON CONFLICT (user_id, ingredient_id) DO UPDATE'
+                f' SET amount = {table}.amount + EXCLUDED.amount',
+                [value for (user_id, ingredient_id), diff in batch
+                 for value in (user_id, ingredient_id, diff)]
+            )
+
+
+def _decrement(rows):
+    """Вычитает количества, не уходя ниже нуля."""
+    by_diff = defaultdict(list)
+    for key, diff in rows:
+        by_diff[diff].append(key)
+    for diff, keys in by_diff.items():
+        pairs = models.Q()
+        for user_id, ingredient_id in keys:
+            pairs |= models.Q(user_id=user_id, ingredient_id=ingredient_id)
+        ShoppingListItem.objects.filter(pairs).update(amount=models.Case(
+            models.When(amount__gt=-diff, then=models.F('amount') + diff),
+            default=models.Value(0),
+        ))
+
+
+@transaction.atomic
+def apply_delta(delta):
+    """Применяет изменения {(user_id, ingredient_id): разница} к спискам."""
+    delta = sorted((key, value) for key, value in delta.items() if value)
+    if not delta:
+        return
+    user_ids = {user_id for (user_id, _), _ in delta}
+    ingredient_ids = {ingredient_id for (_, ingredient_id), _ in delta}
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+    # Существующие строки блокируются в одном порядке во всех
+    # транзакциях, новые вставляются в том же порядке: без взаимных
+    # блокировок при пересекающихся изменениях
+    list(items.select_for_update().order_by(
+        'user_id', 'ingredient_id').values_list('pk', flat=True))
+    _increment([(key, diff) for key, diff in delta if diff > 0])
+    _decrement([(key, diff) for key, diff in delta if diff < 0])
+    items.filter(amount__lte=0).delete()
+
+
+def recipe_totals(recipe_ids, scale=1):
+    """Суммарный состав рецептов, количества умножены на scale."""
+    rows = IngredientForRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', 'amount')
+    ingredient_ids, amounts = columns(rows, 2)
+    return Totals().add(ingredient_ids, None, amounts, scale)
+
+
+def _cart_delta(user_id, recipe_ids, sign):
+    return {
+        (user_id, ingredient_id): amount
+        for ingredient_id, amount in recipe_totals(
+            recipe_ids, sign).as_dict().items()
+    }
+
+
+def add_recipes(user_id, recipe_ids):
+    """Учитывает добавленные в корзину рецепты."""
+    if recipe_ids:
+        apply_delta(_cart_delta(user_id, recipe_ids, 1))
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Учитывает удалённые из корзины рецепты."""
+    if recipe_ids:
+        apply_delta(_cart_delta(user_id, recipe_ids, -1))
+
+
+def clear(user_id):
+    """Очищает список покупок пользователя."""
+    ShoppingListItem.objects.filter(user_id=user_id).delete()
+
+
+def propagate_recipe_change(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта во все корзины с ним."""
+    changes = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    changes = {key: value for key, value in changes.items() if value}
+    if not changes:
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+    apply_delta({
+        (user_id, ingredient_id): diff
+        for user_id in user_ids
+        for ingredient_id, diff in changes.items()
+    })
+
+
+@transaction.atomic
+def rebuild(user_ids):
+    """Полный пересчёт списков покупок по корзинам пользователей."""
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    totals = (
+        IngredientForRecipe.objects
+        .filter(recipe__shoppingcart_related__user_id__in=user_ids)
+        .values('recipe__shoppingcart_related__user_id', 'ingredient_id')
+        .annotate(total_amount=models.Sum('amount'))
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row['recipe__shoppingcart_related__user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total_amount'],
+        )
+        for row in totals
+    )
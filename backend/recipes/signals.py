@@ -0,0 +1,192 @@
+import contextvars
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.catalog import catalog, short_links
+from recipes.images import IMAGE_FIELDS, release
+from recipes.models import (Ingredient, IngredientForRecipe, MealPlanEntry,
+                            Recipe, Tag)
+from recipes.pantry import pantry_index
+from recipes import meal_plan, shopping_list
+from users.models import User
+
+
+# Рецепты, индекс которых нужно обновить после коммита текущей транзакции
+pending_pantry_recipes = contextvars.ContextVar(
+    'pending_pantry_recipes', default=None)
+
+
+def flush_pantry_recipes():
+    recipe_ids = pending_pantry_recipes.get()
+    pending_pantry_recipes.set(None)
+    for recipe_id in recipe_ids or ():
+        pantry_index.refresh_recipe(recipe_id)
+
+
+def refresh_pantry_on_commit(recipe_id):
+    """Одно обновление индекса на рецепт за транзакцию.
+
+    Удаление состава (ingredients.clear()) шлёт post_delete на каждую
+    строку, поэтому рецепты копятся в наборе, который обновляет первый
+    on_commit после коммита.
+    """
+    if transaction.get_autocommit():
+        pantry_index.refresh_recipe(recipe_id)
+        return
+    recipe_ids = pending_pantry_recipes.get()
+    if recipe_ids is None:
+        recipe_ids = set()
+        pending_pantry_recipes.set(recipe_ids)
+    recipe_ids.add(recipe_id)
+    # Вызов ставится на каждую строку: набор может остаться от отменённой
+    # транзакции, чей on_commit отброшен. Первый вызов обновляет весь
+    # набор, остальные находят его пустым
+    transaction.on_commit(flush_pantry_recipes)
+
+
+@receiver((post_save, post_delete), sender=IngredientForRecipe)
+def refresh_pantry_index(sender, instance, **kwargs):
+    """Обновление индекса ингредиентов при правке состава рецепта."""
+    refresh_pantry_on_commit(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_from_pantry_index(sender, instance, **kwargs):
+    """Удаление рецепта из индекса ингредиентов."""
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: pantry_index.remove_recipe(recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    """Сброс справочников в памяти при правке тегов и ингредиентов."""
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_meal_plan_ingredient(sender, instance, **kwargs):
+    """Сброс подытогов плана питания с рецептами удаляемого ингредиента.
+
+    Состав рецептов удаляется каскадом, поэтому рецепты берутся до него.
+    """
+    recipe_ids = list(IngredientForRecipe.objects.filter(
+        ingredient_id=instance.pk).values_list('recipe_id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(
+            lambda: meal_plan.invalidate_recipes(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def add_short_link(sender, instance, **kwargs):
+    """Добавление короткой ссылки рецепта в индекс."""
+    short_url, recipe_id = instance.short_url, instance.pk
+    transaction.on_commit(lambda: short_links.add(short_url, recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_short_link(sender, instance, **kwargs):
+    """Удаление короткой ссылки рецепта из индекса."""
+    short_url = instance.short_url
+    transaction.on_commit(lambda: short_links.remove(short_url))
+
+
+@receiver(pre_delete, sender=Recipe)
+def drop_from_shopping_lists(sender, instance, **kwargs):
+    """Вычитание удаляемого рецепта из списков покупок."""
+    old_amounts = shopping_list.recipe_amounts([instance.pk])[instance.pk]
+    shopping_list.propagate_recipe_change(instance.pk, old_amounts, {})
+
+
+def change_recipes_count(user_id, delta):
+    # updated_at задаётся явно: он входит в ETag рецептов автора
+    User.objects.filter(
+        pk=user_id, recipes_count__gte=-delta
+    ).update(recipes_count=F('recipes_count') + delta,
+             updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_author(sender, instance, **kwargs):
+    """Запоминает прежнего автора, чтобы перенести счётчик при смене."""
+    instance._old_author_id = None
+    if instance.pk is not None:
+        instance._old_author_id = Recipe.objects.filter(
+            pk=instance.pk).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    """Счётчики рецептов авторов при создании и смене автора."""
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if created:
+        change_recipes_count(instance.author_id, 1)
+    elif old_author_id and old_author_id != instance.author_id:
+        change_recipes_count(old_author_id, -1)
+        change_recipes_count(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Уменьшение счётчика рецептов автора."""
+    change_recipes_count(instance.author_id, -1)
+
+
+IMAGE_FIELDS_BY_MODEL = dict(IMAGE_FIELDS)
+
+
+def release_on_commit(name):
+    if name:
+        transaction.on_commit(lambda: release(name))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_image(sender, instance, update_fields=None, **kwargs):
+    """Запоминает картинку до сохранения, чтобы освободить её при замене."""
+    field = IMAGE_FIELDS_BY_MODEL[sender]
+    instance._old_image = None
+    if instance.pk is None or (
+            update_fields is not None and field not in update_fields):
+        return
+    instance._old_image = sender.objects.filter(
+        pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def replace_image(sender, instance, **kwargs):
+    """Освобождение прежней картинки при её замене."""
+    old_name = getattr(instance, '_old_image', None)
+    if old_name != getattr(instance, IMAGE_FIELDS_BY_MODEL[sender]).name:
+        release_on_commit(old_name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def delete_image(sender, instance, **kwargs):
+    """Освобождение картинки удалённого объекта."""
+    release_on_commit(getattr(instance, IMAGE_FIELDS_BY_MODEL[sender]).name)
+
+
+@receiver(pre_save, sender=MealPlanEntry)
+def remember_meal_plan_date(sender, instance, **kwargs):
+    """Запоминает прежнюю дату, чтобы сбросить подытоги обоих дней."""
+    instance._old_date = None
+    if instance.pk is not None:
+        instance._old_date = MealPlanEntry.objects.filter(
+            pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=MealPlanEntry)
+@receiver(post_delete, sender=MealPlanEntry)
+def invalidate_meal_plan_days(sender, instance, **kwargs):
+    """Сброс подытогов изменённых дней плана питания."""
+    user_id = instance.user_id
+    dates = {instance.date, getattr(instance, '_old_date', None)} - {None}
+    transaction.on_commit(lambda: meal_plan.invalidate(user_id, dates))
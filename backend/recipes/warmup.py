@@ -0,0 +1,65 @@
+import gc
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+from recipes.catalog import catalog, short_links
+from recipes.pantry import pantry_index
+
+logger = logging.getLogger('foodgram.startup')
+
+
+def resolve_urls():
+    """Импорт всех view и сериализаторов через разбор URLconf."""
+    get_resolver().url_patterns
+
+
+STEPS = (
+    ('urls', resolve_urls),
+    ('catalog', catalog.load),
+    ('short_links', short_links.preload),
+    ('pantry_index', pantry_index.build),
+)
+
+
+def warmup(freeze=False):
+    """Загружает справочники и индексы до первого запроса.
+
+    Соединения с БД закрываются: после fork их нельзя делить между
+    воркерами. С freeze=True загруженные объекты переносятся в постоянное
+    поколение сборщика мусора, чтобы он не трогал их страницы памяти
+    и они дольше оставались общими после fork. Ошибка шага не мешает
+    старту: шаг пропускается с предупреждением в логе.
+    """
+    if not settings.WARMUP_ENABLED:
+        return {}
+    timings = {}
+    started = time.perf_counter()
+    try:
+        for name, step in STEPS:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as error:
+                # БД может быть ещё недоступна или без миграций: воркер
+                # стартует холодным и загрузит данные при первом запросе
+                logger.warning(json.dumps({
+                    'event': 'startup_step_failed', 'step': name,
+                    'error': repr(error)[:200],
+                }, ensure_ascii=False))
+                timings[name] = None
+                continue
+            timings[name] = round(
+                (time.perf_counter() - step_started) * 1000, 2)
+    finally:
+        connections.close_all()
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(json.dumps({'event': 'startup', 'freeze': freeze, **timings}))
+    return timings
@@ -1,11 +1,24 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from core.admin import InputFilter, LargeTableAdminMixin
 from users.models import User, Subscription
 
 
+class SubscriberFilter(InputFilter):
+    title = 'подписчику (username)'
+    parameter_name = 'user'
+    lookup = 'user__username'
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (username)'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(LargeTableAdminMixin, UserAdmin):
     empty_value_display = 'Не задано'
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff')
     search_fields = ('username', 'email', 'first_name', 'last_name')
@@ -15,10 +28,11 @@ class UserAdmin(UserAdmin):
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     empty_value_display = 'Не задано'
     list_display = ('user', 'author')
-    list_filter = ('user__username', 'author__username')
+    list_filter = (SubscriberFilter, AuthorFilter)
+    autocomplete_fields = ('user', 'author')
     ordering = ('-id',)
 
     def get_queryset(self, request):
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscription = apps.get_model('users', 'Subscription')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    counters = (
+        ('followers_count', Subscription, 'author'),
+        ('following_count', Subscription, 'user'),
+        ('recipes_count', Recipe, 'author'),
+    )
+    for field, model, owner in counters:
+        count = model.objects.filter(
+            **{owner: models.OuterRef('pk')}
+        ).order_by().values(owner).annotate(
+            total=models.Count('id')
+        ).values('total')
+        User.objects.update(
+            **{field: Coalesce(models.Subquery(count), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_updated_at'),
+        ('users', '0002_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
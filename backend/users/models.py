@@ -32,7 +32,16 @@ class User(AbstractUser):
         max_length=128,
         help_text='Пароль должен быть надежным.',
     )
-    avatar = models.ImageField(upload_to='users/', null=True, blank=True)
+    avatar = models.ImageField(
+        upload_to='users/', null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    # Счётчики публичного профиля, поддерживаются сигналами
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+    following_count = models.PositiveIntegerField(
+        'Подписок', default=0, editable=False)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -0,0 +1,55 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Subscription, User
+
+
+def recount_counters(queryset):
+    """Полный пересчёт счётчиков профиля для выбранных пользователей.
+
+    update() не трогает auto_now, поэтому updated_at, по которому строятся
+    ETag рецептов с вложенным автором, обновляется явно.
+    """
+    from recipes.models import Recipe
+
+    counters = (
+        ('followers_count', Subscription, 'author'),
+        ('following_count', Subscription, 'user'),
+        ('recipes_count', Recipe, 'author'),
+    )
+    for field, model, owner in counters:
+        count = model.objects.filter(
+            **{owner: OuterRef('pk')}
+        ).order_by().values(owner).annotate(
+            total=Count('id')
+        ).values('total')
+        queryset.update(
+            updated_at=timezone.now(), **{field: Coalesce(Subquery(count), 0)})
+
+
+def change_counters(subscription, delta):
+    # Не уходим в минус, если счётчики разошлись с данными
+    User.objects.filter(
+        pk=subscription.user_id, following_count__gte=-delta
+    ).update(following_count=F('following_count') + delta,
+             updated_at=timezone.now())
+    User.objects.filter(
+        pk=subscription.author_id, followers_count__gte=-delta
+    ).update(followers_count=F('followers_count') + delta,
+             updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    """Увеличение счётчиков подписок."""
+    if created:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """Уменьшение счётчиков подписок."""
+    change_counters(instance, -1)